@@ -1,5 +1,8 @@
+import history
+
 import wx
 import threading
+import numpy as np
 
 import matplotlib as mpl
 #mpl.use('WXAgg')
@@ -8,6 +11,9 @@ from matplotlib.backends.backend_wx import NavigationToolbar2Wx
 from matplotlib.figure import Figure
 
 
+# Number of points drawn per pixel of graph width, longer histories are decimated to this many points
+POINTS_PER_PIXEL = 2
+
 class MainFrame(wx.Frame):
     def __init__(self, parent, number_of_goods):
         wx.Frame.__init__(self, parent, title="Simulation", size=(1600, 900))
@@ -25,6 +31,9 @@ class MainFrame(wx.Frame):
         self.splitter.SetSashPosition(9999, redraw=True)
         self.splitter.SetSashInvisible()
 
+        # Redraws the graphs at a fixed rate from the main thread while the simulation runs in its own thread
+        self.timer = wx.Timer(self)
+
 
 class ControlPanel(wx.Panel):
     def __init__(self, parent):
@@ -72,7 +81,7 @@ class ConfigPanel(wx.Panel):
 class ToolBar:
     def __init__(self, parent):
         self.tool_bar = parent.CreateToolBar()
-        self.labels = [['GDP', 'Consumption', 'Investment', 'Unemployment', 'Matches'],
+        self.labels = [['GDP', 'Consumption', 'Investment', 'Unemployment', 'Matches', 'Gini'],
                        ['Price', 'Quantity']]
         self.combo_macro = wx.ComboBox(self.tool_bar, size=(100, 20), style=wx.CB_READONLY, choices=self.labels[0])
         self.combo_macro.Bind(wx.EVT_COMBOBOX, self.set_graph)
@@ -99,10 +108,9 @@ class ToolBar:
             for i, choice in enumerate(self.labels[1]):
                 if self.combo_goods.GetValue() == choice:
                     self.graph_number = i
-        # Update the graphs unless the simulation is running or unless the first period hasn't been reached
+        # The graphs are only drawn from the main thread, so they can be updated right away
         import main
-        if not main.simulation.simulation_on and main.simulation.period != 0:
-            main.simulation.display_graphs()
+        main.simulation.display_graphs()
 
 
 class TwoGraphPanel(wx.Panel):
@@ -133,18 +141,72 @@ class Graph(wx.Panel):
 
         self.good_colours = ['red', 'green', 'blue', 'purple', 'orange', 'gold', 'pink', 'turquoise', 'violet']
 
-    def draw(self, label, x, y):
+        # The lines are animated artists: a full redraw only renders the axes, which are saved as the background,
+        # and new data is drawn by restoring the background and blitting the lines over it
+        self.label = None  # Label of the series currently graphed
+        self.lines = []
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        # Called after every full redraw of the canvas, including resizes
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        for line in self.lines:
+            self.axes.draw_artist(line)
+
+    def set_series(self, label, number_of_lines):
+        # Creates the lines of a newly selected series; the only time the axes are cleared
         self.axes.clear()
-        #self.axes.hold(True)
         self.axes.set_ylabel(label)
         self.axes.set_xlabel('Time')
         self.axes.grid(True, color="grey")
-        if type(y[0]) != list:
-            self.axes.plot(x, y, color="grey")
+        if number_of_lines == 1:
+            colours = ["grey"]
+        else:
+            colours = [self.good_colours[i % len(self.good_colours)] for i in range(number_of_lines)]
+        self.lines = [self.axes.plot([], [], color=colour, animated=True)[0] for colour in colours]
+        self.label = label
+        self.background = None
+
+    def rescale(self, x, y):
+        # Widens the axes to fit the data, with room to grow so that the following periods can be blitted
+        # Returns True if the limits changed, which requires a full redraw
+        if len(x) == 0:
+            return False
+        x_min, x_max = np.nanmin(x), np.nanmax(x)
+        y_min, y_max = np.nanmin(y), np.nanmax(y)
+        if not np.isfinite([y_min, y_max]).all():
+            return False
+        changed = False
+        x_low, x_high = self.axes.get_xlim()
+        if x_min < x_low or x_max > x_high:
+            self.axes.set_xlim(x_min, x_min + max(2 * (x_max - x_min), 10))
+            changed = True
+        y_low, y_high = self.axes.get_ylim()
+        if y_min < y_low or y_max > y_high:
+            margin = 0.1 * (y_max - y_min) or 0.1 * abs(y_max) or 1
+            self.axes.set_ylim(y_min - margin, y_max + margin)
+            changed = True
+        return changed
+
+    def draw(self, label, x, y):
+        # y is either a single series, or a (periods x goods) array with one line per good
+        number_of_lines = 1 if y.ndim == 1 else y.shape[1]
+        if label != self.label or number_of_lines != len(self.lines):
+            self.set_series(label, number_of_lines)
+        x, y = history.decimate(x, y, max(self.canvas.GetSize().width, 1) * POINTS_PER_PIXEL)
+        if y.ndim == 1:
+            self.lines[0].set_data(x, y)
+        else:
+            for i, line in enumerate(self.lines):
+                line.set_data(x[:, i], y[:, i])
+        if self.rescale(x, y) or self.background is None:
+            self.canvas.draw()
         else:
-            for i, y_ in enumerate(y):
-                self.axes.plot(x, y_, color=self.good_colours[i])
-        self.canvas.draw()
+            self.canvas.restore_region(self.background)
+            for line in self.lines:
+                self.axes.draw_artist(line)
+            self.canvas.blit(self.axes.bbox)
 
 
 class SettingsFrame(wx.Frame):
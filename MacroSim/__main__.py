@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The modules of MacroSim import each other by their plain names (as when running main.py from this folder)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cli
+
+if __name__ == '__main__':
+    cli.main()
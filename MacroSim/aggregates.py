@@ -0,0 +1,45 @@
+import numpy as np
+
+
+# Running totals of an economy
+# The labour employed by every firm, the output it produces with it and the supply of every market are updated by
+# the change each hire, separation or death makes to them, instead of being summed again every period; the
+# economy's consumption and investment likewise (see MacroEconomy.update_incomes). The rounding errors of the updates
+# add up over time, so every resync_every periods the totals are summed again exactly from the workers and firms.
+
+RESYNC_EVERY = 100
+
+
+class Aggregates:
+    def __init__(self, econ, resync_every=RESYNC_EVERY):
+        self.resync_every = resync_every
+        self.periods = 0  # Periods since the totals were last summed exactly
+        self.resync(econ)
+
+    def add_labour(self, econ, firms, labour):
+        # Adds labour (negative when workers leave) to the firm at the given index, or the firms at the given distinct
+        # indices
+        table = econ.firm_table
+        # Labour cannot fall below zero through rounding
+        table.labour[firms] = np.maximum(table.labour[firms] + labour, 0.0)
+        output = table.get_output(firms)
+        np.add.at(self.supply, table.market[firms], output - self.output[firms])
+        self.output[firms] = output
+
+    def end_period(self, econ):
+        self.periods += 1
+        if self.periods >= self.resync_every:
+            self.resync(econ)
+
+    def resync(self, econ):
+        # Sums every total again from the workers and firms
+        population = econ.population
+        employed = population.get_employed()
+        table = econ.firm_table
+        table.labour[:] = np.bincount(population.employer[employed], weights=population.get_productivity(employed),
+                                      minlength=len(table))
+        self.output = table.get_output()  # Output of each firm with its labour
+        self.supply = np.bincount(table.market, weights=self.output, minlength=len(table.price))  # Of each market
+        econ.consumption = population.consumption.sum()
+        econ.investment = population.investment.sum()
+        self.periods = 0
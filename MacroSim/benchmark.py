@@ -0,0 +1,107 @@
+import engine
+import instrument
+
+import concurrent.futures
+import itertools
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import statistics
+import time
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Benchmark suite of the simulation over a grid of population sizes, numbers of goods and numbers of firms
+# Every case runs with a fixed seed in a fresh process, so that its peak memory is its own and results are
+# comparable from run to run. Timings are medians over the measured periods, after a few warm-up periods, and
+# over several initialisations.
+
+# Changes in time smaller than this many seconds are timer noise, and are never reported as regressions
+NOISE_FLOOR = 0.005
+
+
+def run_case(pop, number_of_goods, number_of_firms, periods, warmup, seed, init_repeats=5):
+    # Times the initialisation, every phase and full periods of a single economy
+    init_seconds = []
+    econ = None
+    for repeat in range(init_repeats):
+        econ = None  # The economy of the previous repetition is freed first, so as not to count in the peak memory
+        start = time.perf_counter()
+        econ = engine.create_economies(pop, number_of_goods, number_of_firms, number_of_economies=1, seed=seed)[0]
+        init_seconds.append(time.perf_counter() - start)
+
+    sim_engine = engine.Engine([econ])
+    for period in range(warmup):
+        sim_engine.step()
+    sim_engine.instrumentation = instrument.Instrumentation()
+    period_seconds = []
+    for period in range(periods):
+        start = time.perf_counter()
+        sim_engine.step()
+        period_seconds.append(time.perf_counter() - start)
+
+    phase_seconds = {}
+    for record in sim_engine.instrumentation.drain():
+        phase_seconds.setdefault(record['phase'], []).append(record['wall_time'])
+    period_median = statistics.median(period_seconds)
+    return {
+        'pop': pop, 'goods': number_of_goods, 'firms': number_of_firms, 'seed': seed, 'periods': periods,
+        'init_seconds': statistics.median(init_seconds),
+        'period_seconds': period_median,
+        'phase_seconds': {phase: statistics.median(seconds) for phase, seconds in phase_seconds.items()},
+        'agent_periods_per_second': pop / period_median,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def get_case_key(case):
+    return case['pop'], case['goods'], case['firms']
+
+
+def run_suite(pops, goods, firms, periods=10, warmup=2, seed=0, init_repeats=5):
+    # Runs every case of the grid, one after the other, each in a new process
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for pop, number_of_goods, number_of_firms in itertools.product(pops, goods, firms):
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            case = executor.submit(run_case, pop, number_of_goods, number_of_firms, periods, warmup, seed,
+                                   init_repeats).result()
+        logger.info("pop %d, goods %d, firms %d: init %.3fs, period %.4fs, %.0f agent-periods/s, peak RSS %.0f MB",
+                    pop, number_of_goods, number_of_firms, case['init_seconds'], case['period_seconds'],
+                    case['agent_periods_per_second'], case['peak_rss_mb'])
+        results.append(case)
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'cases': results}
+
+
+def compare(results, baseline, threshold=0.1, noise_floor=NOISE_FLOOR):
+    # Returns the cases whose period or initialisation time is more than threshold (as a fraction), and more than
+    # noise_floor seconds, slower than the same case in the baseline results
+    baseline_cases = {get_case_key(case): case for case in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        previous = baseline_cases.get(get_case_key(case))
+        if previous is None:
+            continue
+        for measure in ['init_seconds', 'period_seconds']:
+            change = case[measure] / previous[measure] - 1
+            if change > threshold and case[measure] - previous[measure] > noise_floor:
+                regressions.append({'pop': case['pop'], 'goods': case['goods'], 'firms': case['firms'],
+                                    'measure': measure, 'baseline': previous[measure], 'current': case[measure],
+                                    'change': change})
+    return regressions
+
+
+def write_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def read_results(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,245 @@
+import aggregates
+import economy
+import engine
+import history
+import parallel
+import pricing
+import streams
+from demographics import Demographics
+from firm_table import FirmTable
+from labour_market import JobOfferIndex, UnemployedPool
+from population import Population
+from shareholding import ShareRegistry
+
+import json
+import os
+import numpy as np
+import scipy.sparse
+
+
+# Checkpointing of a running simulation
+# A checkpoint is a directory with one sub-directory per economy. The per-worker state (population arrays and the
+# unemployed pool) is written as raw .npy files, which are loaded back in bulk or memory-mapped, and so are the
+# columns of the firm table; the government and the remaining scalars are small and are kept in JSON.
+# The random number streams are saved with every economy, so that a restored run continues exactly like the original one.
+#
+# Layout:
+#   engine.json                    period and settings of the engine
+#   history/                       optional History arrays
+#   economy<id>/state.json         economy and government
+#   economy<id>/firms/*.npy        firm table (the columns of every firm and market)
+#   economy<id>/random.json        state of the random number streams of the economy
+#   economy<id>/population/*.npy   population arrays
+#   economy<id>/unemployed/*.npy   unemployed pool
+#   economy<id>/shares/*.npy       share registry (the initial issue, and the dense or CSR deviations from it)
+
+ECONOMY_FIELDS = ['id', 'gdp', 'consumption', 'investment', 'interest_rate', 'max_firms_in_market', 'price_vector',
+                  'income_list', 'vacancies', 'matches', 'matching_efficiency']
+# The calendar of demographic events is rebuilt from the population on load, only these are saved
+DEMOGRAPHICS_FIELDS = ['month', 'retirement_age', 'age_to_die']
+# Attributes of the firm table that are references to other objects rather than state
+FIRM_TABLE_REFERENCES = ['production_function']
+
+
+def to_json(value):
+    # Converts numpy values to plain Python values for json
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError("{} is not JSON serializable".format(type(value).__name__))
+
+
+def write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, default=to_json)
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_arrays(directory, arrays):
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), array)
+
+
+def load_arrays(directory, mmap=False):
+    # With mmap, arrays are memory-mapped copy-on-write, so they are only read from disk as they are used
+    arrays = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.npy'):
+            arrays[filename[:-4]] = np.load(os.path.join(directory, filename), mmap_mode='c' if mmap else None)
+    return arrays
+
+
+def get_component_state(component):
+    # Returns the class name and attributes of an interchangeable part of an economy, e.g. its utility function
+    if component is None:
+        return None
+    return [type(component).__name__, vars(component)]
+
+
+def load_component(module, state):
+    # Rebuilds a component saved by get_component_state from the class of that name in module
+    if state is None:
+        return None
+    name, attributes = state
+    component_class = getattr(module, name)
+    component = component_class.__new__(component_class)
+    component.__dict__.update({name: np.asarray(value) if isinstance(value, list) else value
+                               for name, value in attributes.items()})
+    return component
+
+
+def save_economy(econ, directory):
+    # Saves the full state of an economy in <directory>/economy<id>
+    path = os.path.join(directory, 'economy{}'.format(econ.id))
+    os.makedirs(path, exist_ok=True)
+    save_arrays(os.path.join(path, 'population'),
+                {name: value for name, value in vars(econ.population).items() if isinstance(value, np.ndarray)})
+    save_arrays(os.path.join(path, 'unemployed'), {'members': econ.unemployed.members[:len(econ.unemployed)],
+                                                   'position': econ.unemployed.position})
+    save_shares(econ.shares, os.path.join(path, 'shares'))
+    table = vars(econ.firm_table)
+    save_arrays(os.path.join(path, 'firms'), {name: value for name, value in table.items()
+                                              if isinstance(value, np.ndarray)})
+    write_json(os.path.join(path, 'state.json'), {
+        'number_of_goods': economy.NUMBER_OF_GOODS,
+        'economy': {name: getattr(econ, name) for name in ECONOMY_FIELDS},
+        'government': vars(econ.government),
+        'utility_function': get_component_state(econ.utility_function),
+        'price_mechanism': get_component_state(econ.price_mechanism),
+        'aggregates': get_component_state(econ.aggregates),
+        'demographics': {name: getattr(econ.demographics, name) for name in DEMOGRAPHICS_FIELDS},
+        'firm_table': {name: value for name, value in table.items()
+                       if not isinstance(value, np.ndarray) and name not in FIRM_TABLE_REFERENCES}})
+    write_json(os.path.join(path, 'random.json'), streams.get_state(econ.rng))
+
+
+def save_shares(shares, directory):
+    shares.commit()
+    arrays = {'shares_per_firm': shares.shares_per_firm, 'issue': shares.issue, 'issued': shares.issued}
+    if shares.sparse:
+        holdings = shares.holdings
+        arrays.update({'data': holdings.data, 'indices': holdings.indices, 'indptr': holdings.indptr})
+    elif shares.holdings is not None:
+        arrays['holdings'] = shares.holdings
+    save_arrays(directory, arrays)
+
+
+def load_shares(directory, pop, mmap=False):
+    arrays = load_arrays(directory, mmap)
+    shares = ShareRegistry.__new__(ShareRegistry)
+    shares.shares_per_firm = arrays['shares_per_firm']
+    shares.shape = (pop, len(shares.shares_per_firm))
+    shares.issue = arrays['issue']
+    shares.issued = arrays['issued']
+    shares.sparse = 'indptr' in arrays
+    if shares.sparse:
+        shares.holdings = scipy.sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                                                  shape=shares.shape)
+    else:
+        shares.holdings = arrays.get('holdings')
+    shares.pending = ([], [], [])
+    return shares
+
+
+def load_economy(directory, economy_id, mmap=False):
+    # Rebuilds an economy saved by save_economy
+    path = os.path.join(directory, 'economy{}'.format(economy_id))
+    state = read_json(os.path.join(path, 'state.json'))
+    economy.NUMBER_OF_GOODS = state['number_of_goods']
+
+    econ = economy.MacroEconomy.__new__(economy.MacroEconomy)
+    econ.__dict__.update(state['economy'])
+    econ.government = economy.Government.__new__(economy.Government)
+    econ.government.__dict__.update(state['government'])
+    econ.utility_function = load_component(economy.utility, state['utility_function'])
+    econ.price_mechanism = load_component(pricing, state['price_mechanism'])
+    econ.aggregates = load_component(aggregates, state['aggregates'])
+    econ.rng = streams.restore_streams(read_json(os.path.join(path, 'random.json')))
+
+    econ.firm_table = FirmTable.__new__(FirmTable)
+    econ.firm_table.__dict__.update(state['firm_table'])
+    econ.firm_table.__dict__.update(load_arrays(os.path.join(path, 'firms')))
+    econ.firm_table.production_function = economy.costmin.COBB_DOUGLAS
+    econ.markets = [economy.Market(econ, i) for i in range(len(econ.firm_table.price))]
+    econ.firms = [economy.Firm(econ, i) for i in range(len(econ.firm_table))]
+
+    econ.population = Population.__new__(Population)
+    econ.population.__dict__.update(load_arrays(os.path.join(path, 'population'), mmap))
+    econ.population.template = None
+    econ.shards = None
+    econ.workers = economy.WorkerList(econ)
+    econ.demographics = Demographics.__new__(Demographics)
+    econ.demographics.__dict__.update(state['demographics'])
+    econ.demographics.rebuild(econ.population.birth_month, econ.population.retired)
+    econ.shares = load_shares(os.path.join(path, 'shares'), len(econ.population), mmap)
+    unemployed = load_arrays(os.path.join(path, 'unemployed'))
+    econ.unemployed = UnemployedPool.__new__(UnemployedPool)
+    econ.unemployed.members = np.empty(len(econ.population), dtype=np.int64)
+    econ.unemployed.members[:len(unemployed['members'])] = unemployed['members']
+    econ.unemployed.position = unemployed['position']
+    econ.unemployed.size = len(unemployed['members'])
+    # The job offer index is rebuilt at the start of every labour market phase, so it starts out empty
+    econ.job_offers = JobOfferIndex.__new__(JobOfferIndex)
+    econ.job_offers.table = econ.firm_table
+    econ.job_offers.heap = []
+    econ.job_offers.version = [0] * len(econ.firm_table)
+    return econ
+
+
+def save_history(sim_history, directory):
+    path = os.path.join(directory, 'history')
+    save_arrays(path, {'x': sim_history.x, 'data': sim_history.data})
+    write_json(os.path.join(path, 'history.json'), {
+        'number_of_economies': sim_history.number_of_economies, 'number_of_goods': sim_history.number_of_goods,
+        'max_periods': sim_history.max_periods, 'count': sim_history.count,
+        'spill_path': sim_history.spill.name if sim_history.spill is not None else None})
+    if sim_history.spill is not None:
+        sim_history.spill.flush()
+
+
+def load_history(directory):
+    path = os.path.join(directory, 'history')
+    if not os.path.exists(path):
+        return None
+    state = read_json(os.path.join(path, 'history.json'))
+    sim_history = history.History.__new__(history.History)
+    sim_history.__dict__.update(load_arrays(path))
+    sim_history.number_of_economies = state['number_of_economies']
+    sim_history.number_of_goods = state['number_of_goods']
+    sim_history.labels = history.get_labels(state['number_of_goods'])
+    sim_history.max_periods = state['max_periods']
+    sim_history.count = state['count']
+    sim_history.spill = open(state['spill_path'], 'ab') if state['spill_path'] is not None else None
+    return sim_history
+
+
+def save_checkpoint(sim_engine, directory, sim_history=None):
+    # Saves every economy of an engine (serial or parallel) and optionally the history of the run
+    os.makedirs(directory, exist_ok=True)
+    sim_engine.call(save_economy, directory)
+    write_json(os.path.join(directory, 'engine.json'), {
+        'economies': [econ.id for econ in sim_engine.economies], 'period': sim_engine.period,
+        'months_per_period': sim_engine.months_per_period, 'retirement_age': sim_engine.retirement_age,
+        'age_to_die': sim_engine.age_to_die})
+    if sim_history is not None:
+        save_history(sim_history, directory)
+
+
+def load_checkpoint(directory, parallel_engine=False, mmap=False, instrumentation=None):
+    # Restores an engine and its history (None if no history was saved) from a checkpoint
+    state = read_json(os.path.join(directory, 'engine.json'))
+    economies = [load_economy(directory, economy_id, mmap) for economy_id in state['economies']]
+    if parallel_engine:
+        sim_engine = parallel.ParallelEngine(economies, instrumentation)
+    else:
+        sim_engine = engine.Engine(economies)
+        sim_engine.instrumentation = instrumentation
+    sim_engine.period = state['period']
+    sim_engine.months_per_period = state['months_per_period']
+    sim_engine.retirement_age = state['retirement_age']
+    sim_engine.age_to_die = state['age_to_die']
+    return sim_engine, load_history(directory)
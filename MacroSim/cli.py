@@ -0,0 +1,261 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import benchmark
+import checkpoint
+import engine
+import ensemble
+import export
+import instrument
+import parallel
+import pricing
+import shards
+import store
+
+
+logger = logging.getLogger(__name__)
+
+# Command line interface for running simulations without the GUI
+# Usage: python -m MacroSim run --pop 10000 --goods 5 --firms 1 --periods 120 --output results.csv
+#        python -m MacroSim sweep --param government.income_tax=0,0.1,0.2 --seeds 0-9 --output sweep.jsonl
+#        python -m MacroSim bench --pop 1e3,1e4,1e5,1e6 --output bench.json --compare baseline.json
+
+
+def run(args):
+    if args.shards > 1 and (args.parallel or args.store_dir is not None):
+        # The processes of a parallel engine cannot start processes of their own, and shards of a stored economy
+        # would copy it to memory
+        logger.error("--shards cannot be combined with --parallel or --store-dir")
+        sys.exit(2)
+    instrumentation = create_instrumentation(args)
+    start = time.time()
+    if args.restore is not None:
+        # Continuing from a checkpoint, the economies are the ones saved in the checkpoint
+        sim_engine = checkpoint.load_checkpoint(args.restore, args.parallel, instrumentation=instrumentation)[0]
+        logger.info("Restored period %d in %.3fs", sim_engine.period, time.time() - start)
+    else:
+        # With --store-dir, the workers are created straight into the store
+        economies = engine.create_economies(args.pop, args.goods, args.firms, args.economies,
+                                            args.sparse_ownership, args.seed, args.store_dir, args.store_chunk_size)
+        for econ in economies:
+            econ.price_mechanism = pricing.create_price_mechanism(args.pricing, args.price_damping,
+                                                                  args.price_tolerance)
+        if args.parallel:
+            sim_engine = parallel.ParallelEngine(economies, instrumentation)
+        else:
+            sim_engine = engine.Engine(economies)
+            sim_engine.instrumentation = instrumentation
+        sim_engine.months_per_period = args.months_per_period
+        logger.info("Initialized %d economies in %.3fs", args.economies, time.time() - start)
+    if args.shards > 1:
+        sim_engine.call(shards.shard_economy, args.shards)
+    if args.store_dir is not None:
+        if args.restore is not None:
+            # Restored economies are loaded in memory, and moved to the store afterwards
+            sim_engine.call(store.store_economy, args.store_dir, args.store_chunk_size)
+        sim_engine.call(store.sync_economy, sim_engine.period)
+    number_of_goods = len(sim_engine.economies[0].markets)
+    if args.snapshot_every:
+        os.makedirs(args.snapshot_dir, exist_ok=True)
+
+    start = time.time()
+    exporter = export.create_exporter(args.output, len(sim_engine.economies), number_of_goods, args.format,
+                                      args.chunk_size)
+    if args.restore is None:
+        exporter.record(sim_engine.period, sim_engine.collect_aggregates())
+    for period in range(args.periods):
+        sim_engine.step()
+        exporter.record(sim_engine.period, sim_engine.collect_aggregates())
+        if args.store_dir is not None:
+            sim_engine.call(store.sync_economy, sim_engine.period)
+        if args.snapshot_every and sim_engine.period % args.snapshot_every == 0:
+            sim_engine.call(export.write_worker_snapshot, args.snapshot_dir, sim_engine.period)
+        if args.checkpoint_every and sim_engine.period % args.checkpoint_every == 0:
+            checkpoint.save_checkpoint(sim_engine, os.path.join(args.checkpoint_dir,
+                                                                'period{}'.format(sim_engine.period)))
+    exporter.close()
+    sim_engine.close()
+    if instrumentation is not None:
+        for summary in instrumentation.get_summary():
+            logger.info("Economy %d - %s: %d calls, %.3fs", summary['economy'], summary['phase'], summary['calls'],
+                        summary['wall_time'])
+        instrumentation.close()
+    logger.info("Ran %d periods in %.3fs", args.periods, time.time() - start)
+
+
+def parse_periods(text):
+    return [int(period) for period in text.split(',')] if text else []
+
+
+def create_instrumentation(args):
+    # Returns the Instrumentation requested on the command line, or None to run without any
+    profile_periods = parse_periods(args.profile_periods)
+    trace_periods = parse_periods(args.trace_periods)
+    if args.metrics is None and not args.track_allocations and not profile_periods and not trace_periods:
+        return None
+    os.makedirs(args.profile_dir, exist_ok=True)
+    return instrument.Instrumentation(args.metrics, args.track_allocations, profile_periods, trace_periods,
+                                      args.profile_dir)
+
+
+def parse_values(text):
+    # Parses either a comma separated list of values, e.g. "0,0.1,0.2",
+    # or a JSON list of values, e.g. "[[0, 0, 0], [0.1, 0, 0]]" for list-valued parameters
+    try:
+        values = json.loads(text)
+    except ValueError:
+        return [json.loads(value) for value in text.split(',')]
+    return values if isinstance(values, list) else [values]
+
+
+def parse_seeds(text):
+    # Parses seeds given as a list "0,1,5" and/or ranges "0-9"
+    seeds = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            seeds.extend(range(int(first), int(last) + 1))
+        else:
+            seeds.append(int(part))
+    return seeds
+
+
+def sweep(args):
+    grid = {}
+    if args.grid is not None:
+        with open(args.grid) as f:
+            grid.update(json.load(f))
+    for param in args.param:
+        name, values = param.split('=', 1)
+        grid[name] = parse_values(values)
+    start = time.time()
+    runs = ensemble.run_ensemble(grid, parse_seeds(args.seeds), args.output, args.pop, args.goods, args.firms,
+                                 args.periods, args.months_per_period, args.workers)
+    logger.info("Ran %d simulations in %.3fs", runs, time.time() - start)
+
+
+def parse_sizes(text):
+    # Parses a comma separated list of sizes, which can be written in scientific notation, e.g. "1e3,1e4"
+    return [int(float(size)) for size in text.split(',')]
+
+
+def bench(args):
+    results = benchmark.run_suite(parse_sizes(args.pop), parse_sizes(args.goods), parse_sizes(args.firms),
+                                  args.periods, args.warmup, args.seed, args.init_repeats)
+    benchmark.write_results(results, args.output)
+    if args.compare is not None:
+        regressions = benchmark.compare(results, benchmark.read_results(args.compare), args.threshold,
+                                        args.noise_floor)
+        for regression in regressions:
+            logger.warning("Regression: pop %d, goods %d, firms %d - %s %.4fs -> %.4fs (%+.0f%%)",
+                           regression['pop'], regression['goods'], regression['firms'], regression['measure'],
+                           regression['baseline'], regression['current'], 100 * regression['change'])
+        if regressions:
+            sys.exit(1)
+
+
+def add_economy_arguments(parser):
+    parser.add_argument('--pop', type=int, default=10000, help="number of workers in each economy")
+    parser.add_argument('--goods', type=int, default=5, help="number of consumption goods")
+    parser.add_argument('--firms', type=int, default=1, help="number of firms in each market")
+    parser.add_argument('--months-per-period', type=float, default=1,
+                        help="number of months the simulation advances per period")
+    parser.add_argument('--periods', type=int, default=100, help="number of periods to simulate")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='MacroSim', description="Runs MacroSim simulations without the GUI")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help="run the economies for a number of periods")
+    add_economy_arguments(run_parser)
+    run_parser.add_argument('--economies', type=int, default=2, help="number of economies simulated side-by-side")
+    run_parser.add_argument('--parallel', action='store_true', help="update each economy in its own process")
+    run_parser.add_argument('--shards', type=int, default=1,
+                            help="number of processes the workers of each economy are split over (without --parallel)")
+    run_parser.add_argument('--store-dir',
+                            help="keep the workers of each economy in memory-mapped files in this directory, which "
+                                 "can be opened read-only while the simulation runs (see store.open_store); the "
+                                 "files change in place during each period, so a reader may see rows of two periods")
+    run_parser.add_argument('--store-chunk-size', type=int, default=store.DEFAULT_CHUNK_SIZE,
+                            help="number of workers created and updated at a time with --store-dir")
+    run_parser.add_argument('--sparse-ownership', action='store_true',
+                            help="store the shares held by workers in a sparse matrix")
+    run_parser.add_argument('--seed', type=int,
+                            help="random seed; the same seed gives the same run, serial or --parallel")
+    run_parser.add_argument('--pricing', choices=pricing.MECHANISMS, default='fixed',
+                            help="how prices adjust to clear the markets (fixed by default)")
+    run_parser.add_argument('--price-damping', type=float,
+                            help="fraction of each price adjustment applied per iteration")
+    run_parser.add_argument('--price-tolerance', type=float, default=1e-8,
+                            help="largest log excess demand accepted as a cleared market")
+    run_parser.add_argument('--output', default='results.csv', help="file the aggregates are written to")
+    run_parser.add_argument('--format', choices=export.FORMATS,
+                            help="format of the output file (by default given by its extension)")
+    run_parser.add_argument('--chunk-size', type=int, default=1024,
+                            help="number of periods buffered before they are written out")
+    run_parser.add_argument('--snapshot-every', type=int, default=0, metavar='N',
+                            help="write the state of every worker every N periods")
+    run_parser.add_argument('--snapshot-dir', default='snapshots', help="directory of the worker snapshots")
+    run_parser.add_argument('--checkpoint-every', type=int, default=0, metavar='N',
+                            help="save a checkpoint of every economy every N periods")
+    run_parser.add_argument('--checkpoint-dir', default='checkpoints', help="directory of the checkpoints")
+    run_parser.add_argument('--restore', metavar='CHECKPOINT',
+                            help="continue from a checkpoint directory for --periods more periods")
+    run_parser.add_argument('--metrics',
+                            help="JSON lines file the time of every phase of every period is written to")
+    run_parser.add_argument('--track-allocations', action='store_true',
+                            help="also measure the memory allocated in every phase (slower)")
+    run_parser.add_argument('--profile-periods', help="comma separated periods to capture with cProfile")
+    run_parser.add_argument('--trace-periods', help="comma separated periods to capture with tracemalloc")
+    run_parser.add_argument('--profile-dir', default='profiles',
+                            help="directory of the cProfile and tracemalloc captures")
+    run_parser.set_defaults(func=run)
+
+    sweep_parser = subparsers.add_parser('sweep', help="run an ensemble over a parameter grid and random seeds")
+    add_economy_arguments(sweep_parser)
+    sweep_parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUES',
+                              help="parameter of the economy and its comma separated values, "
+                                   "e.g. government.income_tax=0,0.1 (can be repeated)")
+    sweep_parser.add_argument('--grid', help="JSON file mapping parameter names to lists of values")
+    sweep_parser.add_argument('--seeds', default='0', help="random seeds, e.g. 0-9 or 1,2,3")
+    sweep_parser.add_argument('--workers', type=int, default=None, help="number of worker processes")
+    sweep_parser.add_argument('--output', default='sweep.jsonl',
+                              help="JSON lines file the runs are appended to; existing runs are skipped")
+    sweep_parser.set_defaults(func=sweep)
+
+    bench_parser = subparsers.add_parser('bench', help="benchmark the simulation over a grid of sizes")
+    bench_parser.add_argument('--pop', default='1e3,1e4,1e5,1e6', help="comma separated population sizes")
+    bench_parser.add_argument('--goods', default='5', help="comma separated numbers of goods")
+    bench_parser.add_argument('--firms', default='1,10', help="comma separated numbers of firms in each market")
+    bench_parser.add_argument('--periods', type=int, default=10, help="number of measured periods")
+    bench_parser.add_argument('--warmup', type=int, default=2, help="number of periods run before measuring")
+    bench_parser.add_argument('--init-repeats', type=int, default=5,
+                              help="number of initialisations timed, of which the median is reported")
+    bench_parser.add_argument('--seed', type=int, default=0)
+    bench_parser.add_argument('--output', default='bench.json', help="JSON file the results are written to")
+    bench_parser.add_argument('--compare', metavar='BASELINE',
+                              help="results of an earlier run; exits with status 1 if any case got slower")
+    bench_parser.add_argument('--threshold', type=float, default=0.1,
+                              help="fraction by which a case may be slower than the baseline")
+    bench_parser.add_argument('--noise-floor', type=float, default=benchmark.NOISE_FLOOR,
+                              help="seconds by which a case may be slower than the baseline whatever the fraction")
+    bench_parser.set_defaults(func=bench)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level, format='%(asctime)s %(name)s %(levelname)s: %(message)s')
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import numpy as np
+
+
+# Cost-minimization engine: solves  min w*L + r*K  s.t.  F(L, K) = q  for many firms at once
+# Every firm of a firm table (see firm_table.py) is solved in a single vectorized call
+
+
+class ProductionFunction:
+    # Base class for a production function F(L, K) evaluated over arrays of firms
+    # params is a (firms x n) array holding each firm's parameters for this functional form (or one firm's row of n)
+    # Subclasses without a closed form only need output() and gradient(); cost_min() then falls back to a
+    # batched Newton solver on the first-order conditions
+
+    def output(self, tfp, params, L, K):
+        raise NotImplementedError
+
+    def gradient(self, tfp, params, L, K):
+        # Returns the marginal products (dF/dL, dF/dK)
+        raise NotImplementedError
+
+    def cost_min(self, tfp, params, wage, int_rate, quantity):
+        return newton_cost_min(self, tfp, params, wage, int_rate, quantity)
+
+
+class CobbDouglas(ProductionFunction):
+    # F(L, K) = tfp * L^a0 * K^a1, where params[:, 0] = a0 and params[:, 1] = a1
+
+    def output(self, tfp, params, L, K):
+        a0, a1 = params.T
+        return tfp * L**a0 * K**a1
+
+    def gradient(self, tfp, params, L, K):
+        a0, a1 = params.T
+        return (tfp * a0 * L**(a0 - 1) * K**a1,
+                tfp * a1 * L**a0 * K**(a1 - 1))
+
+    def cost_min(self, tfp, params, wage, int_rate, quantity):
+        # Closed-form solution: the tangency condition MPL/MPK = w/r gives K/L = (a1*w)/(a0*r),
+        # and substituting into the output constraint pins down the scale
+        # With a zero interest rate capital is free, so the solution is the limit L -> 0, K -> inf
+        a0, a1 = params.T
+        s = a0 + a1
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            scale = (quantity / tfp)**(1 / s)
+            ratio = (a1 * wage) / (a0 * int_rate)  # Optimal K/L
+            L = scale * ratio**(-a1 / s)
+            K = scale * ratio**(a0 / s)
+        return L, K
+
+
+COBB_DOUGLAS = CobbDouglas()
+
+
+def newton_cost_min(production_function, tfp, params, wage, int_rate, quantity, tol=1e-10, max_iter=100):
+    # Batched numerical solution for production functions without a closed form
+    # Solves the first-order conditions  F(L, K) = q  and  r*F_L - w*F_K = 0  with Newton steps in log(L), log(K)
+    # so that both inputs stay positive. Each firm's 2x2 Jacobian is built by finite differences.
+    n = len(tfp)
+    x = np.zeros((n, 2))  # log L, log K, starting from L = K = 1
+    eps = 1e-7
+
+    def residual(x):
+        L, K = np.exp(x[:, 0]), np.exp(x[:, 1])
+        F_L, F_K = production_function.gradient(tfp, params, L, K)
+        return np.stack([np.log(production_function.output(tfp, params, L, K) / quantity),
+                         np.log(int_rate * F_L / (wage * F_K))], axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(max_iter):
+            f = residual(x)
+            if np.all(np.abs(f) < tol):
+                break
+            J = np.empty((n, 2, 2))
+            for j in range(2):
+                step = np.zeros(2)
+                step[j] = eps
+                J[:, :, j] = (residual(x + step) - f) / eps
+            det = J[:, 0, 0] * J[:, 1, 1] - J[:, 0, 1] * J[:, 1, 0]
+            dx0 = (J[:, 1, 1] * f[:, 0] - J[:, 0, 1] * f[:, 1]) / det
+            dx1 = (J[:, 0, 0] * f[:, 1] - J[:, 1, 0] * f[:, 0]) / det
+            # Firms that have already converged (or cannot be solved) are left where they are
+            active = np.isfinite(dx0) & np.isfinite(dx1) & (np.abs(f).max(axis=1) >= tol)
+            x[active, 0] -= np.clip(dx0[active], -5, 5)
+            x[active, 1] -= np.clip(dx1[active], -5, 5)
+    return np.exp(x[:, 0]), np.exp(x[:, 1])
+
+
+def update_cost_min_targets(table, int_rate):
+    # Sets target_L and target_K of every firm (across all markets) of a firm table given the interest rate
+    table.target_L[:], table.target_K[:] = table.production_function.cost_min(
+        table.tfp, table.a, table.get_wage(), np.float64(int_rate), table.quantity_sold[table.market])
@@ -0,0 +1,96 @@
+import heapq
+import numpy as np
+
+
+# Event-scheduled demographics
+# Workers store the month they were born in (on the economy's clock) rather than an age that is updated every
+# period. The month each worker retires and dies is computed once, when the worker is born, and filed in a calendar
+# of one-month buckets. Each period only the buckets that have come due are read, so the cost of a period depends
+# on the number of workers retiring or dying in it, not on the size of the population.
+
+EVENTS = ['retirement', 'death']
+# Events due within this many months of the clock are treated as due, so that rounding in the clock or in birth
+# months does not delay an event by a whole period
+TOLERANCE = 1e-9
+
+
+class Demographics:
+    def __init__(self, birth_month, retired, retirement_age=65, age_to_die=80):
+        self.month = 0.0  # Months elapsed on the economy's clock
+        self.retirement_age = retirement_age  # Age at which a worker retires
+        self.age_to_die = age_to_die  # Age at which a worker dies and is replaced with a new worker
+        self.due = {}  # Month each worker's current event is due (inf if it will never happen)
+        self.calendar = {}  # Bucket (whole month) -> list of arrays of the indices of workers with an event in it
+        self.buckets = {}  # Heap of the buckets in the calendar
+        self.rebuild(birth_month, retired)
+
+    def get_ages(self, birth_month):
+        # Returns the age in years of workers born in birth_month
+        return (self.month - birth_month) / 12
+
+    def schedule(self, index, birth_month, retired):
+        # Files the retirement and death events of the workers at index
+        # Events filed earlier for the same workers are not removed, they are recognised as stale when they come due
+        index = np.asarray(index, dtype=np.int64)
+        births = birth_month[index]
+        self.file('retirement', index, np.where(retired[index], np.inf, births + self.retirement_age * 12))
+        self.file('death', index, births + self.age_to_die * 12)
+
+    def file(self, event, index, due):
+        self.due[event][index] = due
+        scheduled = np.isfinite(due)
+        index, due = index[scheduled], due[scheduled]
+        buckets = np.floor(due).astype(np.int64)
+        order = np.argsort(buckets, kind='stable')
+        index, buckets = index[order], buckets[order]
+        starts = np.flatnonzero(np.diff(buckets, prepend=np.iinfo(np.int64).min))
+        calendar = self.calendar[event]
+        for bucket, members in zip(buckets[starts], np.split(index, starts[1:])):
+            bucket = int(bucket)
+            if bucket not in calendar:
+                calendar[bucket] = []
+                heapq.heappush(self.buckets[event], bucket)
+            calendar[bucket].append(members)
+
+    def set_ages(self, retirement_age, age_to_die, birth_month, retired):
+        # Changing either age invalidates every scheduled event, so the calendar is rebuilt
+        if retirement_age == self.retirement_age and age_to_die == self.age_to_die:
+            return
+        self.retirement_age = retirement_age
+        self.age_to_die = age_to_die
+        self.rebuild(birth_month, retired)
+
+    def rebuild(self, birth_month, retired):
+        # Schedules the events of every worker from scratch
+        self.due = {event: np.full(len(birth_month), np.inf) for event in EVENTS}
+        self.calendar = {event: {} for event in EVENTS}
+        self.buckets = {event: [] for event in EVENTS}
+        self.schedule(np.arange(len(birth_month)), birth_month, retired)
+
+    def advance(self, months):
+        # Moves the clock forward
+        self.month += months
+
+    def pop_due(self, event):
+        # Removes and returns the indices of the workers whose event is due by the current month
+        calendar = self.calendar[event]
+        buckets = self.buckets[event]
+        now = self.month + TOLERANCE
+        due = []
+        while buckets and buckets[0] <= now:
+            bucket = heapq.heappop(buckets)
+            members = np.concatenate(calendar.pop(bucket))
+            months = self.due[event][members]
+            due.append(members[months <= now])
+            # Events of the current bucket that fall later in the month (with a fractional clock) are filed again;
+            # any other event that is not due was superseded by a newer one and is dropped
+            later = members[(months > now) & (np.floor(months) == bucket)]
+            if len(later) > 0:
+                calendar[bucket] = [later]
+                heapq.heappush(buckets, bucket)
+                break
+        if not due:
+            return np.empty(0, dtype=np.int64)
+        index = np.unique(np.concatenate(due))
+        self.due[event][index] = np.inf
+        return index
@@ -0,0 +1,221 @@
+import numpy as np
+
+
+class IncomeDistribution:
+    # Summary statistics of an income distribution
+    # Quantiles are found by selection (np.partition), which is O(N) for any number of requested quantiles. The Gini
+    # coefficient needs the whole Lorenz curve, for which sorting is faster than selecting many ranks, so it is exact
+    # by default. Results are cached, so the same distribution can be queried by the minimum wage, the GUI and the
+    # exporters for the cost of one pass.
+    def __init__(self, incomes, gini_bins=1024):
+        self.incomes = incomes
+        self.gini_bins = gini_bins
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.incomes)
+
+    def get_quantiles(self, q):
+        # Returns the quantiles q (fractions between 0 and 1) with the same linear interpolation as np.percentile
+        q = np.asarray(q, dtype=np.float64)
+        key = ('quantiles', q.tobytes())
+        if key not in self.cache:
+            position = q * (len(self.incomes) - 1)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.ceil(position).astype(np.int64)
+            selected = np.partition(self.incomes, np.unique(np.concatenate([lower.ravel(), upper.ravel()])))
+            self.cache[key] = selected[lower] + (selected[upper] - selected[lower]) * (position - lower)
+        return self.cache[key]
+
+    def get_quantile(self, q):
+        return float(self.get_quantiles([q])[0])
+
+    def get_deciles(self):
+        # Returns the 10th, 20th, ..., 90th percentiles
+        return self.get_quantiles(np.arange(1, 10) / 10)
+
+    def get_gini(self, exact=True):
+        # Returns the Gini coefficient of the distribution
+        # With exact=False the Lorenz curve is built from gini_bins groups of incomes of consecutive ranks, holding the
+        # same number of people each, found by selection. The curve is exact at the edges of the groups and a straight
+        # line in between, which underestimates the coefficient by at most 1 / gini_bins whatever the distribution.
+        key = ('gini', exact)
+        if key not in self.cache:
+            if exact:
+                values = np.sort(self.incomes)
+                weights = np.ones(len(values))
+                self.cache[key] = get_gini(values, weights)
+            else:
+                self.cache[key] = get_gini(*get_rank_groups(self.incomes, self.gini_bins))
+        return self.cache[key]
+
+
+class GatheredIncomeDistribution(IncomeDistribution):
+    # Income distribution split in parts held by other processes (see shards.py)
+    # Only small summaries of each part are gathered: histograms for the Gini coefficient, and for quantiles the
+    # histogram of a narrowing range of incomes around the requested rank, until the few incomes left in the range
+    # are gathered and selected from. Results are exactly those of IncomeDistribution over the joined parts.
+    # gather(function, *args) returns the list of function(incomes, *args) over the parts
+    def __init__(self, gather, gini_bins=1024, select_bins=1024, select_limit=4096):
+        self.gather = gather
+        self.gini_bins = gini_bins
+        self.select_bins = select_bins  # Number of bins the range of incomes around a rank is split in
+        self.select_limit = select_limit  # Largest number of incomes of a part gathered to select from
+        self.cache = {}
+        summaries = gather(get_summary)
+        self.size = sum(size for size, low, high in summaries)
+        self.low = min(low for size, low, high in summaries)
+        self.high = max(high for size, low, high in summaries)
+
+    def __len__(self):
+        return self.size
+
+    def get_ranked(self, rank):
+        # Returns the income of the given rank (0 for the lowest) over every part
+        low, high = self.low, self.high
+        below = 0  # Number of incomes below low
+        while low < high:
+            counts = sum(counts for counts, totals in self.gather(get_histogram, low, high, self.select_bins))
+            cumulative = below + np.cumsum(counts)
+            selected = int(np.searchsorted(cumulative, rank, side='right'))
+            below = int(cumulative[selected] - counts[selected])
+            # The next range is the span of the incomes in the bin of the rank
+            parts = self.gather(get_bin, low, high, self.select_bins, selected, self.select_limit)
+            low = min(part_low for count, part_low, part_high, values in parts)
+            high = max(part_high for count, part_low, part_high, values in parts)
+            if all(values is not None for count, part_low, part_high, values in parts):
+                values = np.concatenate([values for count, part_low, part_high, values in parts])
+                return np.partition(values, rank - below)[rank - below]
+        return low
+
+    def get_quantiles(self, q):
+        q = np.asarray(q, dtype=np.float64)
+        key = ('quantiles', q.tobytes())
+        if key not in self.cache:
+            position = q * (self.size - 1)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.ceil(position).astype(np.int64)
+            ranked = {rank: self.get_ranked(rank) for rank in np.unique(np.concatenate([lower.ravel(), upper.ravel()]))}
+            lower_values = np.vectorize(ranked.get, otypes=[np.float64])(lower)
+            upper_values = np.vectorize(ranked.get, otypes=[np.float64])(upper)
+            self.cache[key] = lower_values + (upper_values - lower_values) * (position - lower)
+        return self.cache[key]
+
+    def get_gini(self, exact=False):
+        # Approximate by default, as the exact coefficient needs every income gathered and sorted in one process
+        key = ('gini', exact)
+        if key not in self.cache:
+            if exact:
+                # Sorting needs every income in one place
+                self.cache[key] = IncomeDistribution(np.concatenate(self.gather(get_incomes))).get_gini(exact=True)
+            else:
+                # The groups of consecutive ranks are approximated by bins split at quantiles merged from a sample of
+                # each part. With twice as many bins and samples as gini_bins, no bin holds more than about
+                # 1 / gini_bins of the people, which bounds the error as for IncomeDistribution.
+                points = 2 * self.gini_bins
+                edges = merge_samples(self.gather(get_sample, points), points)
+                histograms = self.gather(bin_by_edges, edges)
+                self.cache[key] = get_histogram_gini(sum(counts for counts, totals in histograms),
+                                                     sum(totals for counts, totals in histograms))
+        return self.cache[key]
+
+
+def get_summary(incomes):
+    # Returns the number of incomes, the lowest and the highest
+    if len(incomes) == 0:
+        return 0, np.inf, -np.inf
+    return len(incomes), incomes.min(), incomes.max()
+
+
+def get_incomes(incomes):
+    return incomes
+
+
+def get_rank_groups(incomes, groups):
+    # Splits the incomes in (up to) groups groups of consecutive ranks, of sizes differing by at most one
+    # Returns the mean income and the number of people of each group, in order of income
+    size = len(incomes)
+    groups = min(groups, size)
+    if groups == 0:
+        return np.zeros(0), np.zeros(0)
+    starts = np.arange(groups) * size // groups
+    # Selection at the first rank of every group leaves each group in its own segment of the array
+    selected = np.partition(incomes, starts[1:]) if groups > 1 else incomes
+    counts = np.diff(np.append(starts, size)).astype(np.float64)
+    return np.add.reduceat(selected, starts) / counts, counts
+
+
+def get_sample(incomes, points):
+    # Returns the number of incomes and the incomes at points evenly spaced ranks
+    size = len(incomes)
+    if size == 0:
+        return 0, incomes[:0]
+    ranks = np.unique(((np.arange(points) + 0.5) * size / points).astype(np.int64))
+    return size, np.partition(incomes, ranks)[ranks]
+
+
+def merge_samples(samples, bins):
+    # Returns bins - 1 edges splitting the incomes of every part in bins of about the same number of people, from
+    # the samples of get_sample; each sampled income stands for the size / points incomes of its part around it
+    values = np.concatenate([sample for size, sample in samples])
+    if len(values) == 0:
+        return values
+    weights = np.concatenate([np.full(len(sample), size / len(sample)) for size, sample in samples if len(sample)])
+    order = np.argsort(values, kind='stable')
+    cumulative = np.cumsum(weights[order])
+    targets = np.arange(1, bins) * (cumulative[-1] / bins)
+    return values[order][np.minimum(np.searchsorted(cumulative, targets), len(values) - 1)]
+
+
+def bin_by_edges(incomes, edges):
+    # Returns the number of incomes and their total in each bin between consecutive edges (sorted)
+    binned = np.searchsorted(edges, incomes, side='right')
+    return (np.bincount(binned, minlength=len(edges) + 1).astype(np.float64),
+            np.bincount(binned, weights=incomes, minlength=len(edges) + 1))
+
+
+def get_bins(incomes, low, high, bins):
+    # Returns the bin of each income between low and high, split in equal bins; the bins are in order of income
+    if high > low:
+        return np.minimum(((incomes - low) * (bins / (high - low))).astype(np.int64), bins - 1)
+    return np.zeros(len(incomes), dtype=np.int64)
+
+
+def bin_incomes(incomes, low, high, bins):
+    # Returns the number of incomes and their total in each bin, for incomes that all lie between low and high
+    binned = get_bins(incomes, low, high, bins)
+    return (np.bincount(binned, minlength=bins).astype(np.float64),
+            np.bincount(binned, weights=incomes, minlength=bins))
+
+
+def get_histogram(incomes, low, high, bins):
+    # Same as bin_incomes, counting only the incomes between low and high
+    return bin_incomes(incomes[(incomes >= low) & (incomes <= high)], low, high, bins)
+
+
+def get_bin(incomes, low, high, bins, selected, limit):
+    # Returns the number of incomes in one bin of a histogram, their range, and the incomes themselves if there are
+    # no more than limit of them
+    incomes = incomes[(incomes >= low) & (incomes <= high)]
+    incomes = incomes[get_bins(incomes, low, high, bins) == selected]
+    if len(incomes) == 0:
+        return 0, np.inf, -np.inf, incomes
+    return len(incomes), incomes.min(), incomes.max(), incomes if len(incomes) <= limit else None
+
+
+def get_histogram_gini(counts, totals):
+    # Gini coefficient from the number of people and their total income in each bin of a histogram, using the mean
+    # income of each bin
+    nonempty = counts > 0
+    return get_gini(totals[nonempty] / counts[nonempty], counts[nonempty])
+
+
+def get_gini(values, weights):
+    # Gini coefficient of sorted values held by weights people each, from the area under the Lorenz curve
+    income = values * weights
+    total = income.sum()
+    if total <= 0:
+        return 0.0
+    lorenz = np.cumsum(income) / total
+    previous = np.concatenate([[0.0], lorenz[:-1]])
+    return float(1 - np.sum(weights / weights.sum() * (previous + lorenz)))
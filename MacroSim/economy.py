@@ -1,7 +1,20 @@
+import logging
 import numpy as np
 from scipy.optimize import minimize
-import random
 
+import costmin
+from aggregates import Aggregates
+import streams
+import utility
+from demographics import Demographics
+from distribution import IncomeDistribution
+from firm_table import FirmTable
+from labour_market import JobOfferIndex, UnemployedPool
+from population import Population, truncated_normal
+from shareholding import ShareRegistry
+
+
+logger = logging.getLogger(__name__)
 
 # Number of consumption goods in the economy
 NUMBER_OF_GOODS = 5
@@ -9,10 +22,13 @@ NUMBER_OF_GOODS = 5
 
 class MacroEconomy:
     def __init__(self, id, pop, number_of_goods, number_of_firms, util_func_params,
-                 productivity_parameters, ages):
+                 productivity_parameters, ages, sparse_ownership=False, template=None, seed_sequence=None,
+                 population=None):
         global NUMBER_OF_GOODS
         NUMBER_OF_GOODS = number_of_goods
         self.id = id  # identification number, mostly used for debugging
+        # Random number generator of each subsystem (see streams.py), seeded from fresh entropy by default
+        self.rng = streams.create_streams(seed_sequence if seed_sequence is not None else np.random.SeedSequence())
         # Any economic variables in this class represent aggregates
         self.gdp = 0  # Nominal GDP
         self.consumption = 0  # Nominal consumption
@@ -21,37 +37,163 @@ class MacroEconomy:
 
         self.government = Government()
 
-        # Every good is supplied/demanded in a market, and markets are kept track using this array
-        self.markets = np.array([Market(self, number_of_firms) for i in range(NUMBER_OF_GOODS)])
+        # Every good is supplied/demanded in a market, with number_of_firms firms operating in each market
+        # The firms and markets are stored as rows of the firm table
+        self.firm_table = FirmTable(NUMBER_OF_GOODS, number_of_firms)
+        self.markets = [Market(self, i) for i in range(NUMBER_OF_GOODS)]
         self.max_firms_in_market = number_of_firms
-        self.price_vector = [market.price for market in self.markets]  #
-
-        # Array to keep track of every worker
-        self.workers = [Worker(self, productivity_parameters[i], ages[i], number_of_firms, util_func_params[i]) for i in range(pop)]
-        for worker in self.workers:
-            for i, market in enumerate(self.markets):
-                for j, firm in enumerate(market.firms):
-                    worker.stocks_owned[i][j] = firm.NUMBER_OF_SHARES / len(self.workers)
-        # Array to keep track of every unemployed worker
-        # (where each element is a reference to an unmployed worker object)
-        self.unemployed_list = [worker for worker in self.workers]
+        self.price_vector = self.firm_table.price.tolist()
+        # Mechanism clearing the markets every period (see pricing.py), prices stay fixed if it is None
+        self.price_mechanism = None
+
+        # Flat list of every firm in the economy, a firm's position in this list is its index
+        self.firms = [Firm(self, i) for i in range(len(self.firm_table))]
+
+        # Every worker is stored as a row of the population arrays
+        # Economies created from the same template.PopulationTemplate share its initial parameters until they diverge
+        # A population already created elsewhere (e.g. in a store, see store.py) is used as it is
+        if population is not None:
+            self.population = population
+        elif template is not None:
+            self.population = template.create_population()
+        else:
+            self.population = Population(productivity_parameters[:pop], ages[:pop], util_func_params[:pop])
+        self.workers = WorkerList(self)
+        # Shards the workers are updated in (see shards.py and store.py), or None to update them all at once
+        self.shards = None
+        self.utility_function = utility.COBB_DOUGLAS  # Utility function shared by every worker
+        # Calendar of the retirement and death of every worker
+        self.demographics = Demographics(self.population.birth_month, self.population.retired)
+        # Shares of every firm held by each worker, initially spread equally over the population
+        # The equal issue is implicit, so economies sharing a template hold no per-worker holdings until shares
+        # change hands (see shareholding.py)
+        self.shares = ShareRegistry(pop, [firm.NUMBER_OF_SHARES for firm in self.firms], sparse_ownership)
+        self.shares.issue_equally()
+        # Pool of every unemployed worker (as population indices)
+        self.unemployed = UnemployedPool(pop, range(pop))
+        # Running totals of labour, output and spending
+        self.aggregates = Aggregates(self)
+        # Workers past the retirement age start out retired
+        self.retire_workers(self.demographics.pop_due('retirement'))
         self.income_list = []
 
         self.vacancies = 0  # Number of aggregate vacancies
+        self.matches = 0  # Number of matches in the labour market in the last period
         self.matching_efficiency = 0.05  # Matching efficiency in the labour market
+        self.job_offers = JobOfferIndex(self.firm_table)  # Firms with open vacancies, ordered by wage
 
         #self.b = np.array(utility_func_parameters)  # Parameters used in the consumer utility function
 
-        # Randomly assigning jobs to unemployed workers
-        for worker in range(int((len(self.workers) * 0.5))):
-            match = self.unemployed_list[random.randint(0, len(self.unemployed_list) - 1)]
-            self.worker_match(match)
-
-    def create_worker(self, util_func_params):
-        # Creates a new (unemployed) worker
-        new_worker = Worker(self, np.random.normal(1, 0.5), 0, self.max_firms_in_market, util_func_params)
-        self.workers.append(new_worker)
-        self.unemployed_list.append(new_worker)
+        # Randomly assigning jobs to half of the labour force (every worker who is not retired is still unemployed)
+        self.hire_workers(self.unemployed.sample(int(len(self.unemployed) * 0.5), self.rng['labour_market']))
+
+    def create_workers(self, index, util_func_params, productivity=None):
+        # Creates new (unemployed) workers in the population slots of the workers at index, who have died
+        # The new workers start without shares; their productivities are drawn together unless given
+        if productivity is None:
+            productivity = truncated_normal(self.rng['demographics'], 1, 0.5, 0, len(index))
+        self.population.reset(index, productivity, util_func_params, self.demographics.month)
+        self.demographics.schedule(index, self.population.birth_month, self.population.retired)
+        self.shares.clear(index)
+        self.unemployed.add_many(index)
+
+    def kill_workers(self, index, util_func_params, productivity=None):
+        # Kills the workers at the given (distinct) population indices and replaces them with new ones
+        # Employers no longer have access to the workers they employed
+        population = self.population
+        employed = population.employer[index] >= 0
+        self.release_workers(index[employed])
+        self.unemployed.remove_many(index[~employed & ~population.retired[index]])
+        # The newborn workers have no spending until their first income
+        self.consumption -= population.consumption[index].sum()
+        self.investment -= population.investment[index].sum()
+        self.create_workers(index, util_func_params, productivity)  # Creating the new workers
+
+    def kill_worker(self, index, util_func_params, productivity=None):
+        # Kills the particular worker and replaces them with a new one
+        self.kill_workers(np.array([index], dtype=np.int64), np.reshape(util_func_params, (1, -1)),
+                          None if productivity is None else [productivity])
+
+    def release_workers(self, index):
+        # Employed workers at the given population indices leave their firm
+        population = self.population
+        firm_labour = np.bincount(population.employer[index], weights=population.get_productivity(index),
+                                  minlength=len(self.firms))
+        leaving = np.flatnonzero(np.bincount(population.employer[index], minlength=len(self.firms)))
+        self.aggregates.add_labour(self, leaving, -firm_labour[leaving])
+        population.employer[index] = -1
+
+    def separate_workers(self, index):
+        # Employed workers at the given population indices lose their job and become unemployed
+        self.release_workers(index)
+        self.unemployed.add_many(index)
+
+    def retire_workers(self, index):
+        # Workers at the given population indices leave the labour force, they live off their capital income
+        population = self.population
+        employed = population.employer[index] >= 0
+        self.release_workers(index[employed])
+        self.unemployed.remove_many(index[~employed])
+        population.retired[index] = True
+        population.wage[index] = 0
+        population.labour_income[index] = 0
+
+    def update_demographics(self, months, retirement_age, age_to_die):
+        # Advances the clock by a number of months, then retires and replaces the workers whose time has come
+        population = self.population
+        self.demographics.set_ages(retirement_age, age_to_die, population.birth_month, population.retired)
+        self.demographics.advance(months)
+        retirements = self.demographics.pop_due('retirement')
+        self.retire_workers(retirements)
+        deaths = self.demographics.pop_due('death')
+        if len(deaths) > 0:
+            # Workers die in one batch; each passes their utility function parameters through to the new worker
+            self.kill_workers(deaths, population.b[deaths])
+        self.release_rows(np.concatenate([retirements, deaths]))
+
+    def release_rows(self, index):
+        # Hands back the memory of the workers at index, after writing to them outside of the shards, when they are
+        # kept in a store (see store.py)
+        if self.shards is not None:
+            self.shards.release_rows(index)
+
+    def get_ages(self):
+        return self.demographics.get_ages(self.population.birth_month)
+
+    def update_incomes(self, min_wage, index=None):
+        # Updates income, consumption and investment of the selected workers (every worker by default), and the
+        # aggregate consumption and investment by the change in their spending
+        # Workers paid below the minimum wage become unemployed
+        # Every firm pays out its capital and profit income to its shareholders
+        table = self.firm_table
+        firm_payouts = table.capital_income + table.profit_income
+        firm_labour = table.labour
+        firm_labour_income = table.labour_income
+        if index is None and self.shards is not None:
+            if self.shares.has_deviations():
+                # The shards only see the initial issue, as shares change hands in this process: once they have,
+                # the payouts are made here
+                self.population.capital_income[:] = self.shares.get_payouts(firm_payouts)
+                firm_payouts = None
+            fired, self.consumption, self.investment = self.shards.update_incomes(
+                firm_labour, firm_labour_income, firm_payouts, min_wage, self.government.income_tax)
+        else:
+            if index is None:
+                self.consumption = self.investment = 0
+            else:
+                self.consumption -= self.population.consumption[index].sum()
+                self.investment -= self.population.investment[index].sum()
+            fired, consumption, investment = self.population.update_income(
+                firm_labour, firm_labour_income, self.shares.get_payouts(firm_payouts, index), min_wage,
+                self.government.income_tax, index)
+            self.consumption += consumption
+            self.investment += investment
+        if len(fired) > 0:
+            if logger.isEnabledFor(logging.DEBUG):
+                for income in self.population.labour_income[fired]:
+                    logger.debug("Unemployed worker with wage: %s - MW: %s", income, min_wage)
+            self.separate_workers(fired)
+            self.release_rows(fired)
 
     """
     Replaced by manual utility-maximization solution
@@ -97,34 +239,123 @@ class MacroEconomy:
 
     def get_matches(self):
         # Returns the number of aggregate matches in the economy
-        if self.vacancies > 0 and len(self.unemployed_list) > 0:
-            return int(random.uniform(0.8,1.1)*self.matching_efficiency * self.vacancies**0.5 * (len(self.unemployed_list))**0.5)
+        if self.vacancies > 0 and len(self.unemployed) > 0:
+            return int(self.rng['labour_market'].uniform(0.8, 1.1) * self.matching_efficiency * self.vacancies**0.5 *
+                       len(self.unemployed)**0.5)
         else:
             return 0
 
+    def update_vacancies(self):
+        # Re-calculates the number of aggregate vacancies which is used in the matching function
+        # and re-indexes the job offers of every firm
+        self.vacancies = self.firm_table.get_vacancies().sum()
+        self.job_offers.rebuild()
+
     def worker_match(self, match):
         # Provides a simple matching mechanism in which the matched worker accepts the highest paying job offer
-        match.wage = -1
-        # Start by looking for the highest paying firm
-        for market in self.markets:
-            for firm in market.firms:
-                firm.wage = firm.get_wage()
-                if firm.get_vacancies() > 0 and firm.wage >= match.wage:
-                    # Match is found, worker becomes employed
-                    match.wage = firm.wage * match.bargaining_power
-                    match.employer = firm
-                    firm.bargaining_power.append(match.bargaining_power)
+        # match is the population index of an unemployed worker
+        population = self.population
+        table = self.firm_table
+        employer = self.job_offers.best()
         # Once the highest paying firm is found, then update the relevant variables
-        if match.employer is not None:
-            match.employer.labour += match.get_productivity()
-            match.employer.employee_list.append(match)
-            match.employer.vacancies -= 1
+        if employer is not None:
+            population.wage[match] = table.wage[employer] * population.bargaining_power[match]
+            population.employer[match] = employer
+            table.hires[employer] += 1
+            table.bargaining_power_total[employer] += population.bargaining_power[match]
+            self.aggregates.add_labour(self, employer, population.get_productivity(match))
+            table.vacancies[employer] -= 1
             self.vacancies -= 1
-            self.unemployed_list.remove(match)
+            self.unemployed.remove(match)
+            # The hire changes the firm's wage offer and vacancies
+            self.job_offers.update(employer)
+        else:
+            population.wage[match] = -1
+
+    def hire_workers(self, index):
+        # Employs the unemployed workers at the given population indices in one batched assignment
+        # Hiring them one at a time at the highest wage offer (worker_match) spreads the workers over the firms until
+        # every firm offers about the same wage. Instead, the common wage w is solved for directly, by bisection on
+        #   sum over firms of L_f(w) = labour of the firms and the new workers
+        # where L_f(w) = (w / (p * tfp * a0 * K^a1))^(1 / (a0 - 1)) is the labour at which a firm offers the wage w,
+        # and the workers are then assigned in order to fill every firm up to L_f(w)
+        population = self.population
+        productivity = population.get_productivity(index)
+        table = self.firm_table
+        labour = table.labour.copy()
+        a0, a1 = table.a[:, 0], table.a[:, 1]
+        log_scale = np.log(table.price[table.market] * table.tfp * a0 * table.capital**a1)
+        exponent = 1 / (a0 - 1)
+        total = labour.sum() + productivity.sum()
+
+        def get_labour(log_wage):
+            return np.maximum(np.exp((log_wage - log_scale) * exponent), labour)
+
+        low, high = -50.0, 50.0  # Bounds on the log of the common wage
+        for _ in range(100):
+            middle = (low + high) / 2
+            if get_labour(middle).sum() > total:
+                low = middle
+            else:
+                high = middle
+        wage = np.exp(high)
+        # Each worker goes to the firm whose share of the new labour covers the middle of the worker's own
+        bounds = np.cumsum(get_labour(high) - labour)
+        firms = np.minimum(np.searchsorted(bounds, np.cumsum(productivity) - productivity / 2), len(self.firms) - 1)
+
+        population.wage[index] = wage * population.bargaining_power[index]
+        population.employer[index] = firms
+        hired_labour = np.bincount(firms, weights=productivity, minlength=len(self.firms))
+        hires = np.bincount(firms, minlength=len(self.firms))
+        bargaining_power = np.bincount(firms, weights=population.bargaining_power[index], minlength=len(self.firms))
+        table.vacancies -= hires
+        table.hires += hires
+        table.bargaining_power_total += bargaining_power
+        hiring = np.flatnonzero(hires)
+        self.aggregates.add_labour(self, hiring, hired_labour[hiring])
+        self.vacancies -= len(index)
+        self.unemployed.remove_many(index)
+        self.job_offers.rebuild()
+
+    def get_good_demand(self, index=None, prices=None):
+        # Returns the aggregate quantity demanded of each good by the selected workers (every worker by default)
+        # Workers spend their consumption at the given prices (the current prices by default), plus taxes
+        population = self.population
+        if prices is None:
+            prices = self.price_vector
+        prices = np.asarray(prices, dtype=np.float64) * (1 + self.government.get_goods_taxes())
+        if index is None:
+            if self.shards is not None:
+                return self.shards.get_demand(self.utility_function, prices)
+            index = slice(None)
+        return self.utility_function.get_demand(population.consumption[index], population.weights[index], prices)
+
+    def clear_markets(self):
+        # Sets the prices at which the quantity demanded of every good equals last period's quantity supplied,
+        # starting from last period's prices, and returns the quantity demanded at those prices
+        prices, demand = self.price_mechanism.clear(lambda prices: self.get_good_demand(prices=prices),
+                                                    self.price_vector,
+                                                    self.firm_table.quantity_supplied)
+        logger.debug("Prices cleared in %d iterations: %s", self.price_mechanism.iterations, prices)
+        self.firm_table.price[:] = prices
+        self.price_vector = prices.tolist()
+        return demand
+
+    def update_cost_min_targets(self):
+        # Computes the cost-minimizing targets of labour and capital for every firm in one batched call
+        costmin.update_cost_min_targets(self.firm_table, self.interest_rate)
+
+    def get_labour_force(self):
+        # Returns the number of workers who are not retired
+        if self.shards is not None:
+            return self.shards.get_labour_force()
+        return len(self.population) - int(np.count_nonzero(self.population.retired))
 
     def get_income_dist(self):
-        income_dist = np.array([worker.labour_income for worker in self.workers])
-        return np.sort(income_dist)
+        # Distribution of labour income over the labour force, queried without sorting it
+        if self.shards is not None:
+            return self.shards.get_income_dist()
+        return IncomeDistribution(self.population.labour_income[~self.population.retired])
 
 
 class Government:
@@ -135,94 +366,114 @@ class Government:
         self.goods_tax = [0 for i in range(NUMBER_OF_GOODS)]  # Tax rate on a particular consumption good
         # Minimum wage rate is set at some percentile of the economy-wide income distribution
         # For example, a value of 0.3 sets the minimum wage at the income of the person at the 30th percentile
-        self.minimum_wage_rate = 0.5
+        self.minimum_wage_rate = 0.3
         self.minimum_wage = 0
 
     def get_good_tax(self, i):
         # Returns total tax rate on a particular good
         return self.consumption_tax + self.goods_tax[i]
 
+    def get_goods_taxes(self):
+        # Returns an array of the total tax rate on every good
+        return self.consumption_tax + np.asarray(self.goods_tax, dtype=np.float64)
+
     def set_minimum_wage(self, income_dist):
-        self.minimum_wage = np.percentile(income_dist, 30)
-        print(self.minimum_wage)
+        self.minimum_wage = income_dist.get_quantile(self.minimum_wage_rate)
+        logger.debug("Minimum wage: %s", self.minimum_wage)
+
+
+def _table_field(name):
+    # Exposes one column of the firm table as an attribute of a Firm or Market view
+    def getter(self):
+        return getattr(self.econ.firm_table, name)[self.index]
+
+    def setter(self, value):
+        getattr(self.econ.firm_table, name)[self.index] = value
+
+    return property(getter, setter)
 
 
 class Market:
-    def __init__(self, econ, number_of_firms):
+    # Thin view over a single market row of MacroEconomy.firm_table, kept for compatibility with per-market code
+    price = _table_field('price')  # Market price for a consumption good
+    quantity_demanded = _table_field('quantity_demanded')  # Aggregate quantity demanded for the good
+    quantity_supplied = _table_field('quantity_supplied')  # Aggregate quantity supplied for the good
+    quantity_sold = _table_field('quantity_sold')  # Actual output sold (taking the lower quantity between Qs and Qd)
+
+    def __init__(self, econ, index):
         self.econ = econ
-        self.price = 1  # Market price for a consumption good
-        self.quantity_demanded = 1  # Aggregate quantity demanded for the good
-        self.quantity_supplied = 1  # Aggregate quantity supplied for the good
-        self.quantity_sold = 1  # Actual output sold (taking the lower quantity between Qs and Qd)
-        self.firms = np.array([Firm(self, 10) for i in range(number_of_firms)])  # Array of firms operating in the market
+        self.index = index  # Row of the market in the firm table
+
+    @property
+    def firms(self):
+        # Firms operating in the market
+        start = self.econ.firm_table.get_index(self.index, 0)
+        return self.econ.firms[start:start + self.econ.firm_table.firms_per_market]
 
     def get_price(self):
-        # TO DO
-        # (Temporarily disabled price mechanism)
-        return 1
+        # Prices only change when the economy has a price mechanism, which sets them in MacroEconomy.clear_markets
+        return self.price
 
 
 class Firm:
-    def __init__(self, market, tfp):
-        self.market = market  # Reference to the market in which the firm belongs
-        self.tfp = tfp
-        self.labour = 0  # Quantity of homogeneous labour employed by the firm
-        self.capital = 1  # Quantity of capital operated by the firm
-        self.target_L = 0  # L and K targets minimize the firm's costs
-        self.target_K = 0
-        self.wage = 0  # Wage rate paid to all employees
-        self.employee_list = []  # List of every employee reference employed by the firm
-        self.bargaining_power = []
-        self.vacancies = 0  # Number of vacancies in the firm
-        self.a = [2/3, 1/3]  # Parameters on L and K in its Cobb-Douglas production function
-
-        self.NUMBER_OF_SHARES = 1000000  # Each firm has 1 million shares, number chosen arbitrarily
-        self.labour_income = 0
-        self.capital_income = 0
+    # Thin view over a single firm row of MacroEconomy.firm_table, kept for compatibility with per-firm code
+    NUMBER_OF_SHARES = 1000000  # Each firm has 1 million shares, number chosen arbitrarily
+
+    tfp = _table_field('tfp')
+    labour = _table_field('labour')  # Quantity of homogeneous labour employed by the firm
+    capital = _table_field('capital')  # Quantity of capital operated by the firm
+    target_L = _table_field('target_L')  # L and K targets minimize the firm's costs
+    target_K = _table_field('target_K')
+    wage = _table_field('wage')  # Wage rate paid to all employees
+    # Sum of the bargaining power of every worker the firm has hired, and the number of hires
+    bargaining_power_total = _table_field('bargaining_power_total')
+    hires = _table_field('hires')
+    vacancies = _table_field('vacancies')  # Number of vacancies in the firm
+    a = _table_field('a')  # Parameters on L and K in its Cobb-Douglas production function
+    labour_income = _table_field('labour_income')
+    capital_income = _table_field('capital_income')
+    profit_income = _table_field('profit_income')
+
+    def __init__(self, econ, index):
+        self.econ = econ
+        self.index = index  # Position of the firm in MacroEconomy.firms, used as the employer index of its workers
 
     def __str__(self):
         return ("L: " + str(round(self.labour, 2)) + " - K: " + str(round(self.capital, 2)) +
                 " - q: " + str(round(self.get_output(), 2)))
 
+    @property
+    def market(self):
+        # Market in which the firm belongs
+        return self.econ.markets[self.econ.firm_table.market[self.index]]
+
+    @property
+    def production_function(self):
+        # Functional form used by the cost-minimization engine
+        return self.econ.firm_table.production_function
+
     def get_wage(self):
-        if self.labour > 0:
-            return self.market.price * self.tfp * self.a[0] * self.labour**(self.a[0] - 1) * self.capital**self.a[1]
-        else:
-            return 1000
+        return self.econ.firm_table.get_firm_wage(self.index)
 
     def get_vacancies(self):
-        # Returns number of vacancies for a particular period through a matching function
-        # to do: use a better function
-        return max((self.target_L - self.labour) / 10, 100)
+        return float(self.econ.firm_table.get_vacancies([self.index])[0])
 
     def get_output(self):
-        return self.tfp * self.labour**self.a[0] * self.capital**self.a[1]
+        return float(self.econ.firm_table.get_output([self.index])[0])
 
     def mpl(self):
         # Returns marginal product of labour
-        return self.tfp * self.a[0] * self.labour ** (self.a[0] - 1) * self.capital ** self.a[1]
+        return float(self.econ.firm_table.get_marginal_products([self.index])[0][0])
 
     def mpk(self):
         # Returns marginal product of capital
-        return self.tfp * self.a[1] * self.labour ** self.a[0] * self.capital ** (self.a[1] - 1)
+        return float(self.econ.firm_table.get_marginal_products([self.index])[1][0])
 
     def get_average_bargaining_power(self):
-        return sum(self.bargaining_power) / float(len(self.bargaining_power))
-
-    def update_income_payments(self):
-        # Splitting the firm's revenue into two parts: One to capital, the other to labour
-        # The two parts are taken from Euler's theorem: F(L, K) = MPL*L + MPK*K
-        # Therefore, the shares going to income and labour should be MPL*L and MPK*K respectively
-        average_bargaining_power = self.get_average_bargaining_power()
-        labour_income = self.market.price * self.mpl() * self.labour
-        self.labour_income = labour_income
-        self.capital_income = self.market.price * self.mpk() * self.capital
-        # to do: profit income
-        self.profit_income = labour_income * (1-average_bargaining_power)
-        #print(total_income - self.labour_income - self.capital_income)
-
-    # Methods below are for cost-minimization
-    # to do: replace this whole section with hand-written solution
+        return self.econ.firm_table.get_average_bargaining_power(self.index)
+
+    # Methods below are for cost-minimization of a single firm with SLSQP
+    # The simulation uses the batched solution in costmin.update_cost_min_targets instead
     def cost_func(self, x, params):
         sign = params[0]
         int_rate = params[1]
@@ -250,74 +501,104 @@ class Firm:
                         method='SLSQP', options={'disp': False})
 
 
+class WorkerList:
+    # Read-only sequence of Worker views over the population arrays of an economy
+    def __init__(self, econ):
+        self.econ = econ
+
+    def __len__(self):
+        return len(self.econ.population)
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            index = range(len(self))[index]
+        return Worker(self.econ, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield Worker(self.econ, index)
+
+
+def _population_field(name):
+    # Exposes one column of the population arrays as an attribute of a Worker view
+    def getter(self):
+        return getattr(self.econ.population, name)[self.index]
+
+    def setter(self, value):
+        getattr(self.econ.population, name)[self.index] = value
+
+    return property(getter, setter)
+
+
 class Worker:
-    def __init__(self, econ, productivity, age, number_of_firms, util_func_params):
+    # Thin view over a single row of MacroEconomy.population, kept for compatibility with per-worker code
+    productivity = _population_field('productivity')  # Productivity of the individual
+    wage = _population_field('wage')  # Hourly wage paid to the worker by the firm
+    income = _population_field('income')  # Investment + labour earnings
+    consumption = _population_field('consumption')
+    investment = _population_field('investment')
+    savings_rate = _population_field('savings_rate')  # Exogenous savings rate unique to each worker
+    bargaining_power = _population_field('bargaining_power')  # Exogenous bargaining power unique to each worker
+    hours_worked = _population_field('hours_worked')  # Number of hours worked in a 24 hour day
+    labour_income = _population_field('labour_income')
+    capital_income = _population_field('capital_income')
+
+    def __init__(self, econ, index):
         self.econ = econ  # Reference to the economy in which the worker is in
-        self.age = age  # Age of the worker
-        self.productivity = productivity  # Productivity of the individual
-        self.money = 0  # Stock of wealth at a given period
-        self.wage = 0  # Hourly wage paid to the worker by the firm
-        self.income = 0  # Investment + labour earnings
-        self.consumption = 0
-        self.investment = 0
-        self.savings_rate = 0  # Exogenous savings rate unique to each worker
-        self.bargaining_power = 0.7  # Exogenous bargaining power unique to each worker
-        # If worker is employed, job is a reference to the firm that employs the worker
-        self.employer = None
-        self.hours_worked = 8.0  # Number of hours worked in a 24 hour day
-
-        self.labour_income = 0
-        self.capital_income = 0
-        self.stocks_owned = [[0 for i in range(number_of_firms)] for i in range(NUMBER_OF_GOODS)]
-
-        self.b = util_func_params  # Parameters used in a worker's utility function for consumption goods
+        self.index = index  # Row of the worker in the population arrays
+
+    def __eq__(self, other):
+        return isinstance(other, Worker) and self.econ is other.econ and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.econ), self.index))
+
+    @property
+    def b(self):
+        # Parameters used in a worker's utility function for consumption goods
+        return self.econ.population.b[self.index]
+
+    @b.setter
+    def b(self, value):
+        self.econ.population.set_utility_params(self.index, value)
+
+    @property
+    def age(self):
+        # Age of the worker in years
+        return self.econ.demographics.get_ages(self.econ.population.birth_month[self.index])
+
+    @property
+    def retired(self):
+        return bool(self.econ.population.retired[self.index])
+
+    @property
+    def employer(self):
+        # If worker is employed, employer is a reference to the firm that employs the worker
+        index = self.econ.population.employer[self.index]
+        return self.econ.firms[index] if index >= 0 else None
+
+    @property
+    def stocks_owned(self):
+        # Shares owned in each firm, indexed by [good][firm]
+        return self.econ.shares.get_holdings(self.index).reshape(len(self.econ.markets), -1)
 
     def kill(self, util_func_params):
         # Kills the particular worker and replaces them with a new one
-        # If the worker is employed, then the employer no longer has access to this worker
-        if self.employer is not None:
-            self.employer.labour -= self.get_productivity()
-            self.employer.employee_list.remove(self)
-        elif self.employer is None:
-            self.econ.unemployed_list.remove(self)
-        self.econ.workers.remove(self)
-        self.econ.create_worker(util_func_params)  # Creating a new worker
+        self.econ.kill_worker(self.index, util_func_params)
 
     def get_productivity(self):
         # Returns the productivity of a worker.
         # The division by 8 is to normalize the productivity in reference to an 8 hour work day
-        return self.productivity * self.hours_worked / 8
+        return self.econ.population.get_productivity(self.index)
 
     def update_income(self, min_wage):
-        # Calculating the worker's labour income received in the period
-        if self.employer is not None:
-            self.labour_income = (self.get_productivity() / self.employer.labour) * self.employer.labour_income
-            # Applying minimum wage law
-            if self.labour_income < min_wage:
-                # If worker's smallest possible wage is below the minimum wage, then this worker becomes unemployed
-                self.employer = None
-                self.econ.unemployed_list.append(self)
-                print("Unemployed worker with wage: " + str(self.labour_income) + " - MW: " + str(min_wage))
-            else:
-                # If the worker stays employed, then wage is reduced by a bargaining power factor.
-                # However, if this reduced wage is below the minimum wage, then the worker is simply paid the minimum wage
-                # In this second case, the minimum wage helps increase this worker's purchasing power
-                self.labour_income = max(self.labour_income * self.bargaining_power, min_wage)
-        # Calculating the worker's capital income received from firms in the period
-        self.capital_income = 0
-        for i, market in enumerate(self.econ.markets):
-            for j, firm in enumerate(market.firms):
-                self.capital_income = (firm.capital_income + firm.profit_income) * (self.stocks_owned[i][j] / firm.NUMBER_OF_SHARES)
-        # Updating the appropriate income, consumption, and investment variables
-        self.income = (self.labour_income + self.capital_income) * (1 - self.econ.government.income_tax)
-        self.consumption = (1-self.savings_rate) * self.income
-        self.investment = self.savings_rate * self.income
+        # Updates the worker's income, consumption and investment for the period
+        self.econ.update_incomes(min_wage, np.array([self.index]))
 
     def get_good_demand(self, prices):
         # Manual solution to the utility-maximization problem
         # Returns an array of the quantity demanded of each good by the particular worker
-        demand = []
-        for i in range(NUMBER_OF_GOODS):
-            demand.append(self.consumption * self.b[i] / (prices[i] * sum(self.b)))
-        return demand
-
+        population = self.econ.population
+        return list(self.econ.utility_function.get_demand(population.consumption[[self.index]],
+                                                          population.weights[[self.index]],
+                                                          np.asarray(prices, dtype=np.float64)))
@@ -0,0 +1,185 @@
+import economy
+import instrument
+import population
+import shards
+import store
+import streams
+import template
+
+import logging
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+# Labels of the aggregate series recorded for every economy each period
+MACRO_LABELS = ['GDP', 'Consumption', 'Investment', 'Unemployment', 'Matches', 'Gini']
+GOOD_LABELS = ['Price', 'Quantity']
+
+
+def generate_population_parameters(pop, number_of_goods, parameter_seeds, chunk_size=None):
+    # Randomly draws the utility function parameters, productivities and ages of the initial population
+    # Yields them in chunks of chunk_size workers (all at once by default); productivity is normal, truncated at zero
+    # Each parameter is drawn from its own seed sequence, so the population does not depend on the chunk size
+    utility_rng, productivity_rng, age_rng = (np.random.default_rng(seed) for seed in parameter_seeds)
+    chunk_size = chunk_size or max(pop, 1)
+    for start in range(0, pop, chunk_size):
+        size = min(chunk_size, pop - start)
+        yield (utility_rng.uniform(0.1, 0.9, (size, number_of_goods)),
+               population.truncated_normal(productivity_rng, 1, 0.5, 0, size),
+               np.round(age_rng.uniform(0, 80, size), 1))
+
+
+def create_population_parameters(pop, number_of_goods, parameter_seeds):
+    # Returns the utility function parameters, productivities and ages of the whole initial population
+    chunks = list(generate_population_parameters(pop, number_of_goods, parameter_seeds))
+    return tuple(np.concatenate(parameter) for parameter in zip(*chunks))
+
+
+def create_economies(pop, number_of_goods, number_of_firms, number_of_economies=2, sparse_ownership=False,
+                     seed=None, store_dir=None, store_chunk_size=store.DEFAULT_CHUNK_SIZE):
+    # Initializes economies that start from the same initial population so that they can be compared
+    # Several economies share the initial parameters of their workers through a copy-on-write template
+    # With store_dir, the workers of every economy are instead created in its store (see store.py), store_chunk_size
+    # at a time, so that no population is ever held in memory whole
+    # The same seed gives the same economies and trajectories, whether they are updated serially or in parallel
+    population_seed, economy_seeds = streams.spawn_seeds(seed, number_of_economies)
+    parameter_seeds = population_seed.spawn(3)
+    if store_dir is not None:
+        economies = []
+        for i in range(number_of_economies):
+            agent_store = store.AgentStore(store.get_directory(store_dir, i))
+            stored_population = store.create_population(agent_store, pop, generate_population_parameters(
+                pop, number_of_goods, parameter_seeds, store_chunk_size))
+            econ = economy.MacroEconomy(i, pop, number_of_goods, number_of_firms, None, None, None, sparse_ownership,
+                                        seed_sequence=economy_seeds[i], population=stored_population)
+            store.store_economy(econ, store_dir, store_chunk_size, agent_store)
+            economies.append(econ)
+        return economies
+    utility_func_parameters, productivity_parameters, ages = create_population_parameters(
+        pop, number_of_goods, parameter_seeds)
+    population_template = None
+    if number_of_economies > 1:
+        population_template = template.PopulationTemplate(productivity_parameters, ages, utility_func_parameters)
+    return [economy.MacroEconomy(i, pop, number_of_goods, number_of_firms, utility_func_parameters,
+                                 productivity_parameters, ages, sparse_ownership, population_template, economy_seeds[i])
+            for i in range(number_of_economies)]
+
+
+def get_aggregates(econ):
+    # Returns the macro series (in the order of MACRO_LABELS), and the price and quantity sold of every good
+    # Retired workers are outside the labour force, and the unemployment rate is taken over the labour force
+    macro = [econ.gdp, econ.consumption, econ.investment, len(econ.unemployed) / max(econ.get_labour_force(), 1),
+             econ.matches, econ.get_income_dist().get_gini()]
+    prices = econ.firm_table.price.tolist()
+    quantities = econ.firm_table.quantity_sold.tolist()
+    return macro, prices, quantities
+
+
+class Engine:
+    # Updates a set of independent economies period by period
+    # The engine has no knowledge of the GUI; main.Simulation and the command line runner are both consumers of it
+    def __init__(self, economies):
+        self.economies = economies
+        self.period = 0  # Variable for the current time period of the simulation
+        self.months_per_period = 1  # Number of months the simulation will advance per period
+        self.retirement_age = 65  # Age at which a worker retires
+        self.age_to_die = 80  # Age at which a worker gets deleted and replaced with a new worker
+        self.instrumentation = None  # instrument.Instrumentation measuring each phase, if any
+
+    def step(self):
+        # Updates one period in each economy
+        self.period += 1
+        if self.instrumentation is not None:
+            self.instrumentation.start_period(self.period)
+        for econ in self.economies:
+            self.update_economy(econ)
+        if self.instrumentation is not None:
+            self.instrumentation.end_period(self.period)
+
+    def phase(self, econ, name):
+        # Context manager around one phase of update_economy
+        if self.instrumentation is None:
+            return instrument.NULL_PHASE
+        return self.instrumentation.phase(self.period, econ, name)
+
+    def collect_aggregates(self):
+        # Returns the aggregates of every economy, in the same order as self.economies
+        return [get_aggregates(econ) for econ in self.economies]
+
+    def call(self, function, *args):
+        # Calls function(econ, *args) on every economy and returns the results
+        return [function(econ, *args) for econ in self.economies]
+
+    def close(self):
+        # Stops the shard processes of sharded economies
+        for econ in self.economies:
+            if econ.shards is not None:
+                shards.unshard_economy(econ)
+
+    def update_economy(self, econ):
+        # 1: Demand side -----------------------------------------------------------------------------------------------
+
+        with self.phase(econ, 'demand'):
+            econ.price_vector = econ.firm_table.price.tolist()  # Updating price vector
+            # A few months pass; only the workers retiring or dying in them are touched
+            econ.update_demographics(self.months_per_period, self.retirement_age, self.age_to_die)
+            if econ.price_mechanism is not None:
+                # Prices clear every market against last period's supply; demand is the demand at those prices
+                good_demand = econ.clear_markets()
+                econ.firm_table.quantity_demanded[:] = good_demand
+            else:
+                # Aggregate demand for each good is the sum over all workers' individual demand
+                good_demand = econ.get_good_demand()
+                econ.firm_table.quantity_demanded += good_demand
+
+        """
+        Replaced by manual utility-maximization solution
+
+        # Update demand for consumption goods using last period's output and prices
+        for i, quantity in enumerate(econ.util_max_solution().x):
+            econ.markets[i].quantity_demanded = quantity
+        """
+
+        # 2: Getting optimal allocation of L, K ------------------------------------------------------------------------
+
+        with self.phase(econ, 'cost_minimisation'):
+            # Currently unfinished. Missing a mechanism in which firms target optimal values of labour and capital
+            econ.update_cost_min_targets()
+            if logger.isEnabledFor(logging.DEBUG):
+                for firm in econ.firms:
+                    logger.debug("Firm %d target L: %s - L: %s", firm.index, firm.target_L, firm.labour)
+
+        # 3: Labour market ---------------------------------------------------------------------------------------------
+
+        with self.phase(econ, 'labour_market'):
+            # Updating minimum wage
+            econ.government.set_minimum_wage(econ.get_income_dist())
+
+            # Re-calculating the number of aggregate vacancies which is used in the matching function
+            econ.update_vacancies()
+
+            # Matching mechanism: Number of matches in the economy is determined by matching function
+            # Unemployed workers are selected at random to be employed by the highest paying firm
+            econ.matches = econ.get_matches()
+            matched = econ.unemployed.sample(econ.matches, econ.rng['labour_market'])
+            for match in matched:
+                econ.worker_match(match)
+            econ.release_rows(matched)
+
+        # 4: updating variable quantities ------------------------------------------------------------------------------
+
+        with self.phase(econ, 'income'):
+            # Quantity supplied (kept up to date as firms gain and lose workers) and equilibrium quantity in the market
+            table = econ.firm_table
+            table.quantity_supplied[:] = econ.aggregates.supply
+            table.quantity_sold[:] = np.minimum(table.quantity_supplied, table.quantity_demanded)
+            # Getting the total income payments being made to labour and capital in every firm
+            table.update_income_payments()
+
+            # Updating every worker's income, which updates aggregate consumption and investment, then gdp
+            econ.update_incomes(econ.government.minimum_wage)
+            econ.gdp = econ.consumption + econ.investment
+            # The running totals are summed again exactly every few periods
+            econ.aggregates.end_period(econ)
@@ -0,0 +1,121 @@
+import engine
+
+import concurrent.futures
+import itertools
+import json
+import os
+
+
+# Runs an ensemble of single-economy simulations over a grid of parameters and random seeds
+# Parameters are named by their attribute path from the MacroEconomy, for example 'government.income_tax',
+# 'government.minimum_wage_rate' or 'matching_efficiency'.
+# Every completed run is appended as one JSON line to the results file, so a sweep that was interrupted can be
+# resumed by running it again with the same results file: runs that are already in the file, with the same settings
+# (population, goods, firms, periods and months per period), are skipped.
+
+
+def set_parameter(econ, name, value):
+    # Sets a (possibly nested) attribute of an economy, e.g. 'government.income_tax'
+    *path, attribute = name.split('.')
+    target = econ
+    for part in path:
+        target = getattr(target, part)
+    if not hasattr(target, attribute):
+        raise AttributeError("{} has no parameter {}".format(type(target).__name__, name))
+    setattr(target, attribute, value)
+
+
+def get_settings(pop, number_of_goods, number_of_firms, periods, months_per_period):
+    # Settings shared by every run of a sweep
+    return {'pop': pop, 'goods': number_of_goods, 'firms': number_of_firms, 'periods': periods,
+            'months_per_period': months_per_period}
+
+
+def get_run_key(params, seed, settings):
+    # Unique identifier of a run, used to resume a sweep
+    return json.dumps({'params': params, 'seed': seed, 'settings': settings}, sort_keys=True)
+
+
+def create_runs(grid, seeds):
+    # Returns every combination of the parameter grid {name: [values]} and the seeds
+    names = sorted(grid)
+    runs = []
+    for values in itertools.product(*[grid[name] for name in names]):
+        for seed in seeds:
+            runs.append((dict(zip(names, values)), seed))
+    return runs
+
+
+def run_member(pop, number_of_goods, number_of_firms, periods, months_per_period, params, seed):
+    # Runs one member of the ensemble and returns its summary series
+    econ = engine.create_economies(pop, number_of_goods, number_of_firms, number_of_economies=1, seed=seed)[0]
+    for name, value in params.items():
+        set_parameter(econ, name, value)
+    sim_engine = engine.Engine([econ])
+    sim_engine.months_per_period = months_per_period
+
+    series = {label: [] for label in engine.MACRO_LABELS + engine.GOOD_LABELS}
+    for period in range(periods + 1):
+        if period > 0:
+            sim_engine.step()
+        macro, prices, quantities = engine.get_aggregates(econ)
+        for label, value in zip(engine.MACRO_LABELS, macro):
+            series[label].append(float(value))
+        series['Price'].append([float(price) for price in prices])
+        series['Quantity'].append([float(quantity) for quantity in quantities])
+    settings = get_settings(pop, number_of_goods, number_of_firms, periods, months_per_period)
+    return {'key': get_run_key(params, seed, settings), 'params': params, 'seed': seed, 'settings': settings,
+            'series': series}
+
+
+def read_completed(path):
+    # Returns the keys of the runs already written to a results file
+    completed = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    completed.add(json.loads(line)['key'])
+                except (ValueError, KeyError):
+                    # A partially written last line from an interrupted sweep is ignored and re-run
+                    pass
+    return completed
+
+
+def drop_partial_line(path):
+    # Truncates a results file after its last complete line, removing the partially written line of an interrupted
+    # sweep so that the runs appended next start on a line of their own
+    if not os.path.exists(path):
+        return
+    with open(path, 'r+b') as f:
+        position = f.seek(0, os.SEEK_END)
+        while position > 0:
+            start = max(position - 65536, 0)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b'\n')
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
+
+
+def run_ensemble(grid, seeds, output, pop, number_of_goods, number_of_firms, periods, months_per_period=1,
+                 workers=None):
+    # Fans the runs out across a local process pool and streams each result to the output file as it completes
+    # Returns the number of runs that were performed
+    drop_partial_line(output)
+    completed = read_completed(output)
+    settings = get_settings(pop, number_of_goods, number_of_firms, periods, months_per_period)
+    runs = [(params, seed) for params, seed in create_runs(grid, seeds)
+            if get_run_key(params, seed, settings) not in completed]
+    if not runs:
+        return 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor, open(output, 'a') as f:
+        futures = [executor.submit(run_member, pop, number_of_goods, number_of_firms, periods, months_per_period,
+                                   params, seed)
+                   for params, seed in runs]
+        for future in concurrent.futures.as_completed(futures):
+            f.write(json.dumps(future.result()) + '\n')
+            f.flush()
+    return len(runs)
@@ -0,0 +1,158 @@
+import history
+
+import csv
+import os
+import zipfile
+import numpy as np
+
+
+# Streaming exporters for the aggregates of every period
+# Periods are buffered in fixed size chunks and written out chunk by chunk, so the full history is never held in
+# memory. Every format uses the same long layout: one row per period and economy, with the columns
+# period, economy, followed by the series of history.get_labels().
+
+FORMATS = ['csv', 'npz', 'parquet']
+
+# Population arrays written to per-worker snapshots
+SNAPSHOT_FIELDS = ['birth_month', 'retired', 'productivity', 'employer', 'wage', 'labour_income', 'capital_income',
+                   'income', 'consumption', 'investment', 'savings_rate', 'bargaining_power', 'b']
+
+
+class Exporter:
+    def __init__(self, path, number_of_economies, number_of_goods, chunk_size=1024):
+        self.path = path
+        self.number_of_economies = number_of_economies
+        self.labels = history.get_labels(number_of_goods)
+        self.periods = np.empty(chunk_size)
+        self.values = np.empty((chunk_size, number_of_economies, len(self.labels)))
+        self.size = 0  # Number of periods currently buffered
+
+    def get_columns(self):
+        return ['period', 'economy'] + [label.lower().replace(' ', '_') for label in self.labels]
+
+    def append(self, period, values):
+        # Buffers the (economies x series) values of one period
+        self.periods[self.size] = period
+        self.values[self.size] = values
+        self.size += 1
+        if self.size == len(self.periods):
+            self.flush()
+
+    def record(self, period, aggregates):
+        # Buffers the aggregates returned by Engine.collect_aggregates()
+        self.append(period, history.get_values(aggregates))
+
+    def write_history(self, sim_history):
+        # Writes every period held in a History
+        for period, values in zip(sim_history.get_periods(), sim_history.get_values()):
+            self.append(period, values)
+
+    def get_rows(self):
+        # Returns the buffered chunk as a (periods * economies) x columns array in the long layout
+        n = self.size * self.number_of_economies
+        rows = np.empty((n, 2 + len(self.labels)))
+        rows[:, 0] = np.repeat(self.periods[:self.size], self.number_of_economies)
+        rows[:, 1] = np.tile(np.arange(self.number_of_economies), self.size)
+        rows[:, 2:] = self.values[:self.size].reshape(n, len(self.labels))
+        return rows
+
+    def flush(self):
+        if self.size > 0:
+            self.write_chunk(self.get_rows())
+            self.size = 0
+
+    def write_chunk(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+
+class CSVExporter(Exporter):
+    def __init__(self, path, number_of_economies, number_of_goods, chunk_size=1024):
+        Exporter.__init__(self, path, number_of_economies, number_of_goods, chunk_size)
+        self.file = open(path, 'w', newline='')
+        csv.writer(self.file).writerow(self.get_columns())
+
+    def write_chunk(self, rows):
+        np.savetxt(self.file, rows, delimiter=',', fmt=['%d', '%d'] + ['%.17g'] * len(self.labels))
+
+    def close(self):
+        Exporter.close(self)
+        self.file.close()
+
+
+class NPZExporter(Exporter):
+    # Every chunk is added to the archive as a separate array named rows_00000, rows_00001, ...
+    # load_npz() concatenates them back together
+    def __init__(self, path, number_of_economies, number_of_goods, chunk_size=1024):
+        Exporter.__init__(self, path, number_of_economies, number_of_goods, chunk_size)
+        self.file = zipfile.ZipFile(path, 'w', allowZip64=True)
+        self.write_array('columns', np.array(self.get_columns()))
+        self.chunks = 0
+
+    def write_array(self, name, array):
+        with self.file.open(name + '.npy', 'w', force_zip64=True) as f:
+            np.lib.format.write_array(f, array)
+
+    def write_chunk(self, rows):
+        self.write_array('rows_{:05d}'.format(self.chunks), rows)
+        self.chunks += 1
+
+    def close(self):
+        Exporter.close(self)
+        self.file.close()
+
+
+class ParquetExporter(Exporter):
+    # Every chunk is written as a row group. Requires pyarrow
+    def __init__(self, path, number_of_economies, number_of_goods, chunk_size=1024):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("pyarrow is required to export to Parquet")
+        Exporter.__init__(self, path, number_of_economies, number_of_goods, chunk_size)
+        self.pyarrow = pyarrow
+        columns = self.get_columns()
+        self.schema = pyarrow.schema([(columns[0], pyarrow.int64()), (columns[1], pyarrow.int32())] +
+                                     [(column, pyarrow.float64()) for column in columns[2:]])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write_chunk(self, rows):
+        arrays = [self.pyarrow.array(rows[:, 0].astype(np.int64)), self.pyarrow.array(rows[:, 1].astype(np.int32))]
+        arrays += [self.pyarrow.array(rows[:, i]) for i in range(2, rows.shape[1])]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        Exporter.close(self)
+        self.writer.close()
+
+
+def create_exporter(path, number_of_economies, number_of_goods, export_format=None, chunk_size=1024):
+    # Creates an exporter for the given format, or the format given by the file extension
+    if export_format is None:
+        export_format = os.path.splitext(path)[1].lstrip('.').lower()
+    exporters = {'csv': CSVExporter, 'npz': NPZExporter, 'parquet': ParquetExporter}
+    if export_format not in exporters:
+        raise ValueError("Unknown export format '{}', expected one of {}".format(export_format, FORMATS))
+    return exporters[export_format](path, number_of_economies, number_of_goods, chunk_size)
+
+
+def load_npz(path):
+    # Returns the column names and the rows of a file written by NPZExporter
+    with np.load(path) as f:
+        chunks = sorted(name for name in f.files if name.startswith('rows_'))
+        columns = [str(column) for column in f['columns']]
+        rows = np.concatenate([f[name] for name in chunks]) if chunks else np.empty((0, len(columns)))
+    return columns, rows
+
+
+def write_worker_snapshot(econ, directory, period):
+    # Writes the population arrays of an economy to <directory>/economy<id>_period<period>.npz
+    # The arrays are written directly, no Worker objects are built
+    population = econ.population
+    path = os.path.join(directory, 'economy{}_period{}.npz'.format(econ.id, period))
+    np.savez(path, period=period, age=econ.get_ages(),
+             **{field: getattr(population, field) for field in SNAPSHOT_FIELDS})
+    return path
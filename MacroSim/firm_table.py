@@ -0,0 +1,91 @@
+import costmin
+
+import numpy as np
+
+
+class FirmTable:
+    # Structure-of-arrays store for every firm and market in an economy
+    # Firms are rows of the firm columns, market by market: firm f of market m is row m * firms_per_market + f,
+    # which is also its index in MacroEconomy.firms and the employer index of its workers. The market columns have
+    # one row per market. economy.Firm and economy.Market objects are thin views over a single row.
+    # Output, marginal products, wage offers and income payments of every firm are single vectorized expressions.
+    def __init__(self, number_of_markets, firms_per_market, tfp=10):
+        n = number_of_markets * firms_per_market
+        self.firms_per_market = firms_per_market
+        self.market = np.repeat(np.arange(number_of_markets), firms_per_market)  # Market each firm belongs to
+        self.tfp = np.full(n, float(tfp))
+        self.labour = np.zeros(n)  # Quantity of homogeneous labour employed by the firm
+        self.capital = np.ones(n)  # Quantity of capital operated by the firm
+        self.target_L = np.zeros(n)  # L and K targets minimize the firm's costs
+        self.target_K = np.zeros(n)
+        self.wage = np.zeros(n)  # Wage rate paid to all employees
+        self.vacancies = np.zeros(n)  # Number of vacancies in the firm
+        self.a = np.tile([2/3, 1/3], (n, 1))  # Parameters on L and K in each firm's Cobb-Douglas production function
+        self.labour_income = np.zeros(n)
+        self.capital_income = np.zeros(n)
+        self.profit_income = np.zeros(n)
+        # Sum of the bargaining power of every worker the firm has hired, and the number of hires
+        self.bargaining_power_total = np.zeros(n)
+        self.hires = np.zeros(n, dtype=np.int64)
+        # Functional form used by the cost-minimization engine, shared by every firm
+        self.production_function = costmin.COBB_DOUGLAS
+
+        self.price = np.ones(number_of_markets)  # Market price for a consumption good
+        self.quantity_demanded = np.ones(number_of_markets)  # Aggregate quantity demanded for the good
+        self.quantity_supplied = np.ones(number_of_markets)  # Aggregate quantity supplied for the good
+        self.quantity_sold = np.ones(number_of_markets)  # Output sold (the lower quantity between Qs and Qd)
+
+    def __len__(self):
+        return len(self.tfp)
+
+    def get_index(self, market, firm):
+        # Returns the row of firm number firm in a market
+        return market * self.firms_per_market + firm
+
+    def get_output(self, index=slice(None)):
+        return self.production_function.output(self.tfp[index], self.a[index], self.labour[index],
+                                               self.capital[index])
+
+    def get_marginal_products(self, index=slice(None)):
+        # Returns the marginal products of labour and capital; the marginal product of labour is inf without labour
+        with np.errstate(divide='ignore'):
+            return self.production_function.gradient(self.tfp[index], self.a[index], self.labour[index],
+                                                     self.capital[index])
+
+    def get_wage(self, index=slice(None)):
+        # Returns the wage each firm offers, the value of its marginal product of labour (1000 without labour)
+        mpl, mpk = self.get_marginal_products(index)
+        return np.where(self.labour[index] > 0, self.price[self.market[index]] * mpl, 1000.0)
+
+    def get_firm_wage(self, index):
+        # Wage offer of the single firm at the given index, as get_wage() without the overhead of array operations
+        # Used for the firm hiring a matched worker, whose offer changes with every hire
+        if self.labour[index] <= 0:
+            return 1000.0
+        mpl, mpk = self.production_function.gradient(self.tfp[index], self.a[index], self.labour[index],
+                                                     self.capital[index])
+        return float(self.price[self.market[index]] * mpl)
+
+    def get_vacancies(self, index=slice(None)):
+        # Returns number of vacancies for a particular period through a matching function
+        # to do: use a better function
+        return np.maximum((self.target_L[index] - self.labour[index]) / 10, 100)
+
+    def get_average_bargaining_power(self, index=slice(None)):
+        return self.bargaining_power_total[index] / self.hires[index]
+
+    def update_income_payments(self):
+        # Splitting every firm's revenue into two parts: One to capital, the other to labour
+        # The two parts are taken from Euler's theorem: F(L, K) = MPL*L + MPK*K
+        # Therefore, the shares going to income and labour should be MPL*L and MPK*K respectively
+        mpl, mpk = self.get_marginal_products()
+        price = self.price[self.market]
+        employing = self.labour > 0
+        # A firm without labour pays no labour income (the limit of MPL*L as L goes to zero)
+        self.labour_income[:] = 0
+        self.labour_income[employing] = price[employing] * mpl[employing] * self.labour[employing]
+        self.capital_income[:] = price * mpk * self.capital
+        # to do: profit income
+        average_bargaining_power = np.divide(self.bargaining_power_total, self.hires, out=np.zeros(len(self)),
+                                             where=self.hires > 0)
+        self.profit_income[:] = self.labour_income * (1 - average_bargaining_power)
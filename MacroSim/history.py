@@ -0,0 +1,134 @@
+import engine
+
+import numpy as np
+
+
+def get_labels(number_of_goods):
+    # Names of the series recorded for every economy
+    return (engine.MACRO_LABELS + ['Price {}'.format(i) for i in range(number_of_goods)] +
+            ['Quantity {}'.format(i) for i in range(number_of_goods)])
+
+
+def get_values(aggregates):
+    # Flattens the aggregates returned by Engine.collect_aggregates() into an (economies x series) array
+    return np.array([np.concatenate([macro, prices, quantities]) for macro, prices, quantities in aggregates],
+                    dtype=np.float64)
+
+
+class History:
+    # Time series of the aggregates of every economy, stored in a preallocated (periods x economies x series) array
+    # The series are the macro variables (engine.MACRO_LABELS) followed by the price and then the quantity of
+    # every good. Readers get views into the array, so no data is copied; a view should be re-read after new
+    # periods are recorded since the array is reallocated as it grows.
+    #
+    # By default the array grows geometrically and keeps every period. If max_periods is given it becomes a fixed
+    # size ring buffer that keeps only the most recent periods. Every row is then written twice, at i and
+    # i + max_periods, so that the most recent periods are always a single contiguous slice. If spill_path is also
+    # given, periods that leave the ring buffer are appended to that file (see load_spill).
+    def __init__(self, number_of_economies, number_of_goods, capacity=1024, max_periods=None, spill_path=None):
+        self.number_of_economies = number_of_economies
+        self.number_of_goods = number_of_goods
+        self.labels = get_labels(number_of_goods)
+        self.max_periods = max_periods
+        if max_periods is not None:
+            capacity = 2 * max_periods
+        self.x = np.empty(capacity)  # Period of each row
+        self.data = np.empty((capacity, number_of_economies, len(self.labels)))
+        self.count = 0  # Number of periods recorded since the start
+        self.spill = open(spill_path, 'ab') if spill_path is not None and max_periods is not None else None
+
+    def __len__(self):
+        # Number of periods currently held in memory
+        if self.max_periods is None:
+            return self.count
+        return min(self.count, self.max_periods)
+
+    def get_start(self):
+        # Position of the oldest period held in memory
+        if self.max_periods is None or self.count <= self.max_periods:
+            return 0
+        return self.count % self.max_periods
+
+    def append(self, period, values):
+        # Records the (economies x series) values of one period
+        if self.max_periods is None:
+            if self.count == len(self.x):
+                self.grow()
+            self.x[self.count] = period
+            self.data[self.count] = values
+        else:
+            position = self.count % self.max_periods
+            if self.spill is not None and self.count >= self.max_periods:
+                # The oldest period is about to be overwritten
+                self.spill.write(np.float64(self.x[position]).tobytes())
+                self.spill.write(np.ascontiguousarray(self.data[position], dtype=np.float64).tobytes())
+            for i in (position, position + self.max_periods):
+                self.x[i] = period
+                self.data[i] = values
+        self.count += 1
+
+    def record(self, period, aggregates):
+        # Records the aggregates returned by Engine.collect_aggregates()
+        self.append(period, get_values(aggregates))
+
+    def grow(self):
+        # Doubles the capacity of the arrays
+        x = np.empty(2 * len(self.x))
+        x[:self.count] = self.x[:self.count]
+        data = np.empty((2 * len(self.data),) + self.data.shape[1:])
+        data[:self.count] = self.data[:self.count]
+        self.x = x
+        self.data = data
+
+    def get_periods(self):
+        start = self.get_start()
+        return self.x[start:start + len(self)]
+
+    def get_values(self):
+        # Returns a (periods x economies x series) view of every period held in memory
+        start = self.get_start()
+        return self.data[start:start + len(self)]
+
+    def get_series(self, label, economy):
+        # Returns a view of one series of one economy
+        return self.get_values()[:, economy, self.labels.index(label)]
+
+    def get_goods(self, label, economy):
+        # Returns a (periods x goods) view of the price or quantity ('Price' or 'Quantity') of every good
+        start = len(engine.MACRO_LABELS) + engine.GOOD_LABELS.index(label) * self.number_of_goods
+        return self.get_values()[:, economy, start:start + self.number_of_goods]
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+
+def load_spill(path, number_of_economies, number_of_goods):
+    # Memory-maps a spill file written by History and returns its periods and (periods x economies x series) values
+    number_of_series = len(engine.MACRO_LABELS) + 2 * number_of_goods
+    rows = np.memmap(path, dtype=np.float64, mode='r').reshape(-1, 1 + number_of_economies * number_of_series)
+    return rows[:, 0], rows[:, 1:].reshape(-1, number_of_economies, number_of_series)
+
+
+def decimate(x, y, points):
+    # Min/max decimation of a series for plotting: the periods are split into points / 2 buckets and only the lowest
+    # and highest value of each bucket are kept, in the order they occur, so that every peak and trough is still drawn
+    # y is a single series or a (periods x series) array. Returns x and y with one column per series when y is 2-D,
+    # as the kept periods differ between series.
+    n = len(x)
+    if n <= points:
+        return (x, y) if y.ndim == 1 else (np.broadcast_to(x[:, np.newaxis], y.shape), y)
+    size = -(-n // (points // 2))  # Periods per bucket
+    buckets = -(-n // size)
+    # The last bucket is padded by repeating the last period, which adds no new extremes
+    index = np.minimum(np.arange(buckets * size), n - 1).reshape(buckets, size)
+    values = y.reshape(n, -1)[index]  # (buckets x size x series)
+    low, high = values.argmin(axis=1), values.argmax(axis=1)
+    order = np.stack([np.minimum(low, high), np.maximum(low, high)], axis=1)  # (buckets x 2 x series)
+    kept = index[np.arange(buckets)[:, np.newaxis, np.newaxis], order]
+    kept = kept.reshape(2 * buckets, -1)  # Rows of the kept periods, per series
+    y_kept = np.take_along_axis(y.reshape(n, -1), kept, axis=0)
+    if y.ndim == 1:
+        return x[kept[:, 0]], y_kept[:, 0]
+    return x[kept], y_kept
@@ -0,0 +1,137 @@
+import contextlib
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+
+
+# Instrumentation of the phases of Engine.update_economy
+# When an engine has no Instrumentation attached, each phase is entered through a shared no-op context manager,
+# so nothing is measured or allocated.
+
+PHASES = ['demand', 'cost_minimisation', 'labour_market', 'income']
+
+NULL_PHASE = contextlib.nullcontext()
+
+
+class Phase:
+    # Context manager measuring one phase of one economy in one period
+    def __init__(self, instrumentation, period, economy_id, name):
+        self.instrumentation = instrumentation
+        self.period = period
+        self.economy_id = economy_id
+        self.name = name
+        self.start = 0
+        self.memory = 0
+
+    def __enter__(self):
+        if self.instrumentation.track_allocations:
+            self.memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall_time = time.perf_counter() - self.start
+        allocated = None
+        if self.instrumentation.track_allocations:
+            allocated = tracemalloc.get_traced_memory()[0] - self.memory
+        self.instrumentation.emit({'period': self.period, 'economy': self.economy_id, 'phase': self.name,
+                                   'wall_time': wall_time, 'allocated': allocated})
+        return False
+
+
+class Instrumentation:
+    # Records the wall time and allocation delta (net bytes allocated, if track_allocations) of every phase,
+    # per economy and per period. Records are appended as JSON lines to metrics_path if it is given, and are
+    # accumulated into totals that can be read with get_summary() or scraped with format_prometheus().
+    # cProfile and tracemalloc captures of whole periods are written to output_dir for the periods listed in
+    # profile_periods and trace_periods.
+    def __init__(self, metrics_path=None, track_allocations=False, profile_periods=(), trace_periods=(),
+                 output_dir='.'):
+        self.metrics_path = metrics_path
+        self.track_allocations = track_allocations
+        self.profile_periods = set(profile_periods)
+        self.trace_periods = set(trace_periods)
+        self.output_dir = output_dir
+        self.sink = open(metrics_path, 'a') if metrics_path is not None else None
+        self.records = []  # Records emitted since the last call to drain()
+        self.totals = {}  # (economy, phase) -> [calls, wall time, bytes allocated]
+        self.profiler = None
+        self.started_tracing = False
+        if track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def for_worker(self):
+        # Returns a copy for a worker process, which sends its records back instead of writing them
+        return Instrumentation(None, self.track_allocations, self.profile_periods, self.trace_periods,
+                               self.output_dir)
+
+    def phase(self, period, econ, name):
+        return Phase(self, period, econ.id, name)
+
+    def emit(self, record):
+        totals = self.totals.setdefault((record['economy'], record['phase']), [0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += record['wall_time']
+        totals[2] += record['allocated'] or 0
+        self.records.append(record)
+        if self.sink is not None:
+            self.sink.write(json.dumps(record) + '\n')
+
+    def drain(self):
+        # Returns and forgets the records emitted since the last call
+        records = self.records
+        self.records = []
+        return records
+
+    def start_period(self, period):
+        if period in self.trace_periods:
+            self.started_tracing = not tracemalloc.is_tracing()
+            if self.started_tracing:
+                tracemalloc.start()
+        if period in self.profile_periods:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def end_period(self, period, name='engine'):
+        # name distinguishes the captures of the worker processes of a parallel engine
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(os.path.join(self.output_dir, '{}_period{}.prof'.format(name, period)))
+            self.profiler = None
+        if period in self.trace_periods:
+            tracemalloc.take_snapshot().dump(os.path.join(self.output_dir,
+                                                          '{}_period{}.tracemalloc'.format(name, period)))
+            if self.started_tracing and not self.track_allocations:
+                tracemalloc.stop()
+        self.flush()
+
+    def flush(self):
+        if self.sink is not None:
+            self.sink.flush()
+        self.records = self.records[-10000:]  # Records that are never drained do not grow without bound
+
+    def get_summary(self):
+        # Returns the totals of every phase of every economy
+        return [{'economy': economy_id, 'phase': phase, 'calls': calls, 'wall_time': wall_time,
+                 'allocated': allocated if self.track_allocations else None}
+                for (economy_id, phase), (calls, wall_time, allocated) in sorted(self.totals.items())]
+
+    def format_prometheus(self):
+        # Returns the totals in the Prometheus text exposition format
+        lines = ['# TYPE macrosim_phase_calls_total counter', '# TYPE macrosim_phase_seconds_total counter']
+        if self.track_allocations:
+            lines.append('# TYPE macrosim_phase_allocated_bytes_total counter')
+        for summary in self.get_summary():
+            labels = '{{economy="{}",phase="{}"}}'.format(summary['economy'], summary['phase'])
+            lines.append('macrosim_phase_calls_total{} {}'.format(labels, summary['calls']))
+            lines.append('macrosim_phase_seconds_total{} {!r}'.format(labels, summary['wall_time']))
+            if self.track_allocations:
+                lines.append('macrosim_phase_allocated_bytes_total{} {}'.format(labels, summary['allocated']))
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
@@ -0,0 +1,121 @@
+import heapq
+
+import numpy as np
+
+
+class JobOfferIndex:
+    # Max-heap of the firms that have open vacancies, keyed on the wage they offer
+    # A hire only changes the wage and vacancies of the hiring firm, so instead of re-scanning every firm the
+    # firm is re-inserted with its new wage. Outdated heap entries are skipped lazily using a version number per firm.
+    def __init__(self, table):
+        self.table = table  # Firm table (see firm_table.py), entries are the rows of its firms
+        self.heap = []
+        self.version = []
+        self.rebuild()
+
+    def rebuild(self):
+        # Re-reads the wage offer of every firm, used at the start of the labour market phase
+        table = self.table
+        table.wage[:] = table.get_wage()
+        self.version = [0] * len(table)
+        hiring = np.flatnonzero(table.get_vacancies() > 0)
+        # Ties are broken in favour of the firm with the highest index
+        self.heap = list(zip((-table.wage[hiring]).tolist(), (-hiring).tolist(), [0] * len(hiring)))
+        heapq.heapify(self.heap)
+
+    def update(self, index):
+        # Re-inserts the firm at the given index after its labour has changed
+        table = self.table
+        self.version[index] += 1
+        table.wage[index] = table.get_firm_wage(index)
+        if table.get_vacancies(index) > 0:
+            heapq.heappush(self.heap, (-float(table.wage[index]), -index, self.version[index]))
+
+    def best(self):
+        # Returns the index of the highest paying firm with an open vacancy, or None if there are no job offers
+        while self.heap:
+            wage, index, version = self.heap[0]
+            if version == self.version[-index]:
+                return -index
+            heapq.heappop(self.heap)
+        return None
+
+
+def get_unique(index):
+    # Sorted distinct values of an integer array (a sort is faster than np.unique on large arrays of indices)
+    index = np.sort(np.asarray(index, dtype=np.int64))
+    return index[np.concatenate([[True], index[1:] != index[:-1]])] if len(index) > 0 else index
+
+
+class UnemployedPool:
+    # Set of unemployed workers (population indices) with O(1) insertion and removal
+    # Members are packed at the front of an array; a removal moves the last member into the freed position
+    def __init__(self, pop, members=()):
+        self.members = np.empty(pop, dtype=np.int64)
+        self.position = np.full(pop, -1, dtype=np.int64)  # Position of each worker in members, -1 if employed
+        self.size = 0
+        self.add_many(members)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, index):
+        return self.position[index] >= 0
+
+    def __iter__(self):
+        return iter(self.members[:self.size].tolist())
+
+    def add(self, index):
+        if self.position[index] < 0:
+            self.members[self.size] = index
+            self.position[index] = self.size
+            self.size += 1
+
+    def add_many(self, index):
+        index = np.asarray(index, dtype=np.int64)
+        index = get_unique(index[self.position[index] < 0])
+        self.members[self.size:self.size + len(index)] = index
+        self.position[index] = np.arange(self.size, self.size + len(index))
+        self.size += len(index)
+
+    def remove(self, index):
+        position = self.position[index]
+        if position < 0:
+            raise ValueError("worker {} is not unemployed".format(index))
+        last = self.members[self.size - 1]
+        self.members[position] = last
+        self.position[last] = position
+        self.position[index] = -1
+        self.size -= 1
+
+    def remove_many(self, index):
+        # Removes k workers in O(k): the members left beyond the new end of the pool fill the freed positions before it
+        index = get_unique(index)
+        if len(index) == 0:
+            return
+        positions = self.position[index]
+        if np.any(positions < 0):
+            raise ValueError("a worker is not unemployed")
+        size = self.size - len(index)
+        holes = positions[positions < size]
+        staying = np.ones(self.size - size, dtype=bool)
+        staying[positions[positions >= size] - size] = False
+        moved = self.members[size:self.size][staying]
+        self.members[holes] = moved
+        self.position[moved] = holes
+        self.position[index] = -1
+        self.size = size
+
+    def sample(self, k, rng):
+        # Returns k distinct unemployed workers drawn at random (from the Generator rng), in random order
+        k = min(k, self.size)
+        if 4 * k > self.size:
+            positions = rng.permutation(self.size)[:k]
+        else:
+            # Few draws from a large pool: draw with replacement and top up any duplicates
+            positions = np.unique(rng.integers(0, self.size, k))
+            while len(positions) < k:
+                extra = rng.integers(0, self.size, k - len(positions))
+                positions = np.unique(np.concatenate([positions, extra]))
+            rng.shuffle(positions)
+        return self.members[positions]
@@ -1,154 +1,91 @@
 import GUI
 import economy
+import engine
+import history
 
 import wx
+import logging
+import queue
 import threading
-import random
-import numpy as np
 import time
 
 
+logger = logging.getLogger(__name__)
+
+# Number of periods the simulation thread can run ahead of the graphs before it waits for the GUI to catch up
+SNAPSHOT_QUEUE_SIZE = 256
+# Milliseconds between two redraws of the graphs while the simulation runs
+REDRAW_INTERVAL = 100
+
+
 class Simulation(threading.Thread):
-    def __init__(self):
+    # Runs the engine from the GUI and keeps the history of every graphed variable
+    # The engine runs in its own thread (main_loop) and publishes the aggregates of every period to a bounded queue.
+    # Only the wx main thread touches the history and the graphs: a timer drains the queue and redraws the graphs.
+    def __init__(self, simulation_engine):
+        self.engine = simulation_engine
         self.simulation_on = False
-        self.simulation_speed = 1  # Number of iterations before graphs get updated
+        self.simulation_speed = 1  # Number of new periods needed before graphs get updated
+        self.snapshots = queue.Queue(SNAPSHOT_QUEUE_SIZE)  # (period, aggregates) published by the simulation thread
         self.timer = 0  # Used to keep track of the time it takes to run a period (for debugging)
-        self.period = 0  # Variable for the current time period of the simulation
-        self.months_per_period = 1  # Number of months the simulation will advance per period
-        self.retirement_age = 65  # Age at which a worker retires
-        self.age_to_die = 80  # Age at which a worker gets deleted and replaced with a new worker
         # Lists of the graph labels
-        self.macro_labels = ['GDP', 'Consumption', 'Investment', 'Unemployment', 'Matches']
-        self.good_labels = ['Price', 'Quantity']
-        # The following are variables used to store economic variables so that they can be graphed
-        self.x = []
-        self.y_macro = [[[], []] for i in range(len(self.macro_labels))]
-        self.y_price = [[[], []] for i in range(economy.NUMBER_OF_GOODS)]
-        self.y_quantity = [[[], []] for i in range(economy.NUMBER_OF_GOODS)]
-
-        self.store_graph_variables()
+        self.macro_labels = engine.MACRO_LABELS
+        self.good_labels = engine.GOOD_LABELS
+        # Stores economic variables so that they can be graphed
+        self.history = history.History(len(simulation_engine.economies), economy.NUMBER_OF_GOODS)
+
+        self.history.record(self.period, self.engine.collect_aggregates())
         self.display_graphs()
 
+    @property
+    def period(self):
+        # Variable for the current time period of the simulation
+        return self.engine.period
+
     def main_loop(self):
         # Main loop of the program. One iteration of this loop will update one period in each economy
         while self.simulation_on:
-            self.period += 1  # Incrementing the period
-            # Print out the period in the console for debugging
-            print("----------------------------------------"
-                  "Period {} - Time: {}"
-                  "----------------------------------------"
-                  .format(self.period, format(time.time() - self.timer, '.6f') if self.period != 1 else 0))
+            self.engine.step()
+            # Log the period and the time it took for debugging
+            logger.info("Period %d - Time: %s", self.period,
+                        format(time.time() - self.timer, '.6f') if self.period != 1 else 0)
             self.timer = time.time()
 
-            # Loops over the two economies and updates each one independently
-            for econ in economies:
-
-                # 1: Demand side ---------------------------------------------------------------------------------------
-
-                econ.price_vector = [market.get_price() for market in econ.markets]  # Updating price vector
-                for worker in econ.workers:
-                    worker.age += self.months_per_period / 12  # Each worker ages a few months
-                    if worker.age >= self.age_to_die:
-                        worker.kill(worker.b)  # Worker dies; passes through the old utility function parameters to the new worker
-                    else:
-                        # If the worker stays alive, then update his/her individual demand for consumption goods
-                        indiv_good_demand = worker.get_good_demand(econ.price_vector)
-                        # And aggregate demand for each good is the sum over all workers' demand
-                        for i, market in enumerate(econ.markets):
-                            market.quantity_demanded += indiv_good_demand[i]
-
-                """
-                Replaced by manual utility-maximization solution
-                
-                # Update demand for consumption goods using last period's output and prices
-                for i, quantity in enumerate(econ.util_max_solution().x):
-                    econ.markets[i].quantity_demanded = quantity
-                """
-
-                # 2: Getting optimal allocation of L, K ----------------------------------------------------------------
-
-                # Currently unfinished. Missing a mechanism in which firms target optimal values of labour and capital
-                for market in econ.markets:
-                    for firm in market.firms:
-                        L, K = firm.cost_min_solution(econ.interest_rate).x
-                        firm.target_L = L
-                        firm.target_K = K
-                        print(str(firm.target_L) + " - " + str(firm.labour))
-
-                # 3: Labour market -------------------------------------------------------------------------------------
-
-                # Updating minimum wage
-                econ.government.set_minimum_wage(econ.get_income_dist())
-
-                # Re-calculating the number of aggregate vacancies which is used in the matching function
-                econ.vacancies = 0
-                for market in econ.markets:
-                    for firm in market.firms:
-                        econ.vacancies += firm.get_vacancies()
-
-                # Matching mechanism: Number of matches in the economy is determined by matching function
-                # Unemployed workers are selected at random to be employed by the highest paying firm
-                for i in range(econ.get_matches()):
-                    match = econ.unemployed_list[random.randint(0, len(econ.unemployed_list) - 1)]
-                    econ.worker_match(match)
-
-                # 4: updating variable quantities ----------------------------------------------------------------------
-
-                # Calculating quantity supplied and equilibrium quantity in the market
-                for market in econ.markets:
-                    market.quantity_supplied = 0
-                    for firm in market.firms:
-                        market.quantity_supplied += firm.get_output()
-                    market.quantity_sold = min(market.quantity_supplied, market.quantity_demanded)
-                    # Getting the total income payments being made to labour and capital in each firm
-                    for firm in market.firms:
-                        firm.update_income_payments()
-
-                # Resetting aggregate variables in order to re-sum them
-                econ.gdp = 0
-                econ.consumption = 0
-                econ.investment = 0
-                # re-summing aggregate quantities (gdp, consumption, investment)
-                for worker in econ.workers:
-                    worker.update_income(econ.government.minimum_wage)
-                    econ.consumption += worker.consumption
-                    econ.investment += worker.investment
-                econ.gdp = econ.consumption + econ.investment
-
-            # Updating graphs
-            self.store_graph_variables()
-            if self.period % self.simulation_speed == 0:
-                self.display_graphs()
+            # Handing the period over to the GUI; blocks while the graphs are SNAPSHOT_QUEUE_SIZE periods behind
+            self.snapshots.put((self.period, self.engine.collect_aggregates()))
+        # Drawing the last periods without waiting for the timer
+        wx.CallAfter(self.update_graphs)
 
     def store_graph_variables(self):
-        # Storing initial values of every variable that needs to be graphed
-        self.x.append(self.period)
-        for econ in economies:
-            self.y_macro[0][econ.id].append(econ.gdp)
-            self.y_macro[1][econ.id].append(econ.consumption)
-            self.y_macro[2][econ.id].append(econ.investment)
-            self.y_macro[3][econ.id].append(len(econ.unemployed_list) / len(econ.workers))
-            self.y_macro[4][econ.id].append(econ.get_matches())
-            for i in range(economy.NUMBER_OF_GOODS):
-                self.y_price[i][econ.id].append(econ.markets[i].price)
-                self.y_quantity[i][econ.id].append(econ.markets[i].quantity_sold)
+        # Storing values of every variable that needs to be graphed, from the periods published so far
+        # Returns the number of new periods
+        count = 0
+        while True:
+            try:
+                period, aggregates = self.snapshots.get_nowait()
+            except queue.Empty:
+                return count
+            self.history.record(period, aggregates)
+            count += 1
+
+    def update_graphs(self, event=None):
+        # Runs in the main thread, on every tick of the frame's timer
+        new_periods = self.store_graph_variables()
+        if new_periods >= self.simulation_speed or (new_periods > 0 and not self.simulation_on):
+            self.display_graphs()
 
     def display_graphs(self):
         # Re-draws the graphs on the GUI for both economies
-        # to do: Clean this part up, it's messy
+        # The graphs are given views into the history, so nothing is copied
+        x = self.history.get_periods()
         if frame.tool_bar.graph_type == 0:
+            label = self.macro_labels[frame.tool_bar.graph_number]
             for i, graph in enumerate(frame.two_graph_panel.graphs):
-                graph.draw(self.macro_labels[frame.tool_bar.graph_number],
-                           self.x, self.y_macro[frame.tool_bar.graph_number][i])
+                graph.draw(label, x, self.history.get_series(label, i))
         elif frame.tool_bar.graph_type == 1:
+            label = self.good_labels[frame.tool_bar.graph_number]
             for i, graph in enumerate(frame.two_graph_panel.graphs):
-                y = []
-                for j in range(economy.NUMBER_OF_GOODS):
-                    if frame.tool_bar.graph_number == 0:
-                        y.append(self.y_price[j][i])
-                    elif frame.tool_bar.graph_number == 1:
-                        y.append(self.y_quantity[j][i])
-                graph.draw(self.good_labels[frame.tool_bar.graph_number], self.x, y)
+                graph.draw(label, x, self.history.get_goods(label, i))
 
 
 def create_main_frame(pop, number_of_goods, number_of_firms):
@@ -158,24 +95,16 @@ def create_main_frame(pop, number_of_goods, number_of_firms):
     global simulation
     frame = GUI.MainFrame(None, number_of_goods)
     frame.Show()
-    utility_func_parameters = [[] for i in range(pop)]
-    productivity_parameters = [float(-1) for i in range(pop)]
-    for i in range(pop):
-        utility_func_parameters[i] = [random.uniform(0.1, 0.9) for i in range(number_of_goods)]
-        while productivity_parameters[i] < 0:
-            productivity_parameters[i] = np.random.normal(1, 0.5)
-    ages = [round(random.uniform(0, 80), 1) for i in range(pop)]
-    economies = [economy.MacroEconomy(0, pop, number_of_goods, number_of_firms, utility_func_parameters,
-                                      productivity_parameters, ages),
-                 economy.MacroEconomy(1, pop, number_of_goods, number_of_firms, utility_func_parameters,
-                                      productivity_parameters, ages)]
-    simulation = Simulation()
+    economies = engine.create_economies(pop, number_of_goods, number_of_firms)
+    simulation = Simulation(engine.Engine(economies))
+    frame.Bind(wx.EVT_TIMER, simulation.update_graphs, frame.timer)
+    frame.timer.Start(REDRAW_INTERVAL)
 
 
 """
 def get_config():
     return [
-        [simulation.simulation_speed, simulation.months_per_period],
+        [simulation.simulation_speed, simulation.engine.months_per_period],
         [[econ.minimum_wage for econ in economies]]
     ]
 
@@ -184,6 +113,7 @@ def save_config():
 """
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     app = wx.App()
     settings_frame = GUI.SettingsFrame(None)
     settings_frame.Show()
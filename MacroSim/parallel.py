@@ -0,0 +1,90 @@
+from engine import Engine, get_aggregates
+
+import multiprocessing
+
+
+def run_economy(connection, econ, instrumentation):
+    # Runs in a worker process: owns a single economy and updates it one period at a time on request
+    # The economy draws from its own random number streams (see streams.py), so the process needs no reseeding
+    sim_engine = Engine([econ])
+    sim_engine.instrumentation = instrumentation
+    while True:
+        command, args = connection.recv()
+        if command == 'step':
+            sim_engine.period, sim_engine.months_per_period, sim_engine.retirement_age, sim_engine.age_to_die = args
+            if instrumentation is not None:
+                instrumentation.start_period(sim_engine.period)
+            sim_engine.update_economy(econ)
+            if instrumentation is not None:
+                instrumentation.end_period(sim_engine.period, 'economy{}'.format(econ.id))
+                # The phase records are sent back to the parent process along with the aggregates
+                connection.send((get_aggregates(econ), instrumentation.drain()))
+            else:
+                connection.send((get_aggregates(econ), []))
+        elif command == 'call':
+            function, function_args = args
+            connection.send(function(econ, *function_args))
+        elif command == 'stop':
+            # The final state of the economy is sent back if requested, once its shards (if any) are closed
+            sim_engine.close()
+            connection.send(econ if args else None)
+            connection.close()
+            break
+
+
+class ParallelEngine(Engine):
+    # Updates every economy in its own process. The economies never interact within a period, so the processes
+    # only synchronise at the end of each period to send back the aggregates that are graphed or exported.
+    # While the processes are running, the economies held by this object are stale copies of the initial state;
+    # use call() to query the live economies, or close() to bring their final state back.
+    def __init__(self, economies, instrumentation=None):
+        Engine.__init__(self, economies)
+        self.instrumentation = instrumentation
+        self.aggregates = [get_aggregates(econ) for econ in economies]
+        self.connections = []
+        self.processes = []
+        for econ in economies:
+            connection, child_connection = multiprocessing.Pipe()
+            worker_instrumentation = instrumentation.for_worker() if instrumentation is not None else None
+            process = multiprocessing.Process(target=run_economy,
+                                              args=(child_connection, econ, worker_instrumentation), daemon=True)
+            process.start()
+            child_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def step(self):
+        # Updates one period in each economy, in parallel
+        self.period += 1
+        for connection in self.connections:
+            connection.send(('step', (self.period, self.months_per_period, self.retirement_age, self.age_to_die)))
+        self.aggregates = []
+        for connection in self.connections:
+            aggregates, records = connection.recv()
+            self.aggregates.append(aggregates)
+            for record in records:
+                self.instrumentation.emit(record)
+        if self.instrumentation is not None:
+            self.instrumentation.flush()
+
+    def collect_aggregates(self):
+        return self.aggregates
+
+    def call(self, function, *args):
+        # Calls function(econ, *args) on every live economy and returns the results
+        # The function must be picklable, i.e. defined at the top level of a module
+        for connection in self.connections:
+            connection.send(('call', (function, args)))
+        return [connection.recv() for connection in self.connections]
+
+    def close(self, collect=True):
+        # Stops the worker processes. If collect is True, the final state of every economy is copied back
+        for connection in self.connections:
+            connection.send(('stop', collect))
+        economies = [connection.recv() for connection in self.connections]
+        for process in self.processes:
+            process.join()
+        if collect:
+            self.economies = economies
+        self.connections = []
+        self.processes = []
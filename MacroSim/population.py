@@ -0,0 +1,126 @@
+import numpy as np
+import scipy.special
+
+
+# Initial parameters of the workers, which populations starting from the same template.PopulationTemplate share
+TEMPLATE_FIELDS = ['birth_month', 'productivity', 'b', 'weights']
+
+
+def truncated_normal(rng, mean, sd, low, size=None):
+    # Draws from a normal distribution truncated below at low by inverting its CDF, so no draw is rejected
+    u = rng.uniform(scipy.special.ndtr((low - mean) / sd), 1, size)
+    return mean + sd * scipy.special.ndtri(u)
+
+
+class Population:
+    # Structure-of-arrays store for every worker in an economy
+    # Each worker is a row index into the arrays below; economy.Worker objects are thin views over a single row
+    # With a template, the TEMPLATE_FIELDS are copy-on-write views of the template's arrays instead of new arrays
+    def __init__(self, productivity_parameters=None, ages=None, util_func_params=None, template=None):
+        self.template = template
+        if template is None:
+            # Month each worker was born in on the economy's clock, which starts at month 0 (see demographics.py)
+            self.birth_month = -12 * np.array(ages, dtype=np.float64)
+            self.productivity = np.array(productivity_parameters, dtype=np.float64)  # Exogenous productivity
+            # Parameters used in each worker's utility function for consumption goods (pop x goods)
+            self.b = np.array(util_func_params, dtype=np.float64).reshape(len(self.productivity), -1)
+            # The same parameters normalised to sum to one for each worker, as used by the demand engine (utility.py)
+            self.weights = self.b / self.b.sum(axis=1)[:, np.newaxis]
+        else:
+            for name in TEMPLATE_FIELDS:
+                setattr(self, name, template.open(name))
+        pop = len(self.productivity)
+        self.retired = np.zeros(pop, dtype=bool)  # Retired workers have left the labour force
+        self.hours_worked = np.full(pop, 8.0)  # Number of hours worked in a 24 hour day
+        # Index of the employing firm in MacroEconomy.firms, or -1 if the worker is unemployed
+        self.employer = np.full(pop, -1, dtype=np.int64)
+        self.wage = np.zeros(pop)  # Hourly wage paid to the worker by the firm
+        self.labour_income = np.zeros(pop)
+        self.capital_income = np.zeros(pop)
+        self.income = np.zeros(pop)  # Investment + labour earnings
+        self.consumption = np.zeros(pop)
+        self.investment = np.zeros(pop)
+        self.savings_rate = np.zeros(pop)  # Exogenous savings rate unique to each worker
+        self.bargaining_power = np.full(pop, 0.7)  # Exogenous bargaining power unique to each worker
+
+    def __len__(self):
+        return len(self.productivity)
+
+    def __getstate__(self):
+        # A population sent to another process only carries the rows of its template arrays that have diverged,
+        # the rest is mapped from the template again on the other side
+        state = self.__dict__.copy()
+        if self.template is not None:
+            for name in TEMPLATE_FIELDS:
+                array = state[name]
+                changed = np.flatnonzero((array != self.template.open(name)).reshape(len(array), -1).any(axis=1))
+                state[name] = (changed, np.asarray(array[changed]))
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.template is not None:
+            for name in TEMPLATE_FIELDS:
+                changed, rows = state[name]
+                array = self.template.open(name)
+                array[changed] = rows
+                setattr(self, name, array)
+
+    def get_productivity(self, index=slice(None)):
+        # Returns the productivity of the selected workers.
+        # The division by 8 is to normalize the productivity in reference to an 8 hour work day
+        return self.productivity[index] * self.hours_worked[index] / 8
+
+    def get_employed(self):
+        return np.flatnonzero(self.employer >= 0)
+
+    def reset(self, index, productivity, util_func_params, birth_month):
+        # Replaces the worker in a slot with a newborn, unemployed worker
+        self.birth_month[index] = birth_month
+        self.retired[index] = False
+        self.productivity[index] = productivity
+        self.hours_worked[index] = 8.0
+        self.employer[index] = -1
+        self.wage[index] = 0
+        self.labour_income[index] = 0
+        self.capital_income[index] = 0
+        self.income[index] = 0
+        self.consumption[index] = 0
+        self.investment[index] = 0
+        self.savings_rate[index] = 0
+        self.bargaining_power[index] = 0.7
+        self.set_utility_params(index, util_func_params)
+
+    def set_utility_params(self, index, util_func_params):
+        self.b[index] = util_func_params
+        self.weights[index] = self.b[index] / self.b[index].sum(axis=-1, keepdims=True)
+
+    def update_income(self, firm_labour, firm_labour_income, capital_income, min_wage, income_tax, index=None):
+        # Updates the income, consumption and investment of the selected workers (all workers by default)
+        # Returns the indices of workers whose wage fell below the minimum wage, which the caller separates from their
+        # firm, and the total consumption and investment of the selected workers
+        if index is None:
+            index = np.arange(len(self))
+        employed = index[self.employer[index] >= 0]
+        firms = self.employer[employed]
+        labour_income = self.get_productivity(employed) / firm_labour[firms] * firm_labour_income[firms]
+        self.labour_income[employed] = labour_income
+        # Applying minimum wage law
+        # If worker's smallest possible wage is below the minimum wage, then this worker becomes unemployed
+        below = labour_income < min_wage
+        fired = employed[below]
+        # If the worker stays employed, then wage is reduced by a bargaining power factor.
+        # However, if this reduced wage is below the minimum wage, then the worker is simply paid the minimum wage
+        kept = employed[~below]
+        self.labour_income[kept] = np.maximum(labour_income[~below] * self.bargaining_power[kept], min_wage)
+        # Capital income received from firms in the period (as computed by the economy's share registry)
+        self.capital_income[index] = capital_income
+        # Updating the appropriate income, consumption, and investment variables
+        income = (self.labour_income[index] + capital_income) * (1 - income_tax)
+        savings_rate = self.savings_rate[index]
+        consumption = (1 - savings_rate) * income
+        investment = savings_rate * income
+        self.income[index] = income
+        self.consumption[index] = consumption
+        self.investment[index] = investment
+        return fired, consumption.sum(), investment.sum()
@@ -0,0 +1,102 @@
+import logging
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Price mechanism: clears every market of an economy at once
+# Prices are adjusted on the vector of excess demand log(Qd / Qs) of all goods together, in log-space so that they
+# stay positive. Each call starts from the prices of the previous period, which are usually close to clearing.
+# Markets without supply or demand at the starting prices cannot clear and keep their price.
+
+MECHANISMS = ['fixed', 'tatonnement', 'newton']
+
+
+class Tatonnement:
+    # Walrasian tatonnement: the log price of each good moves by damping times its log excess demand
+    # A damping of 1 clears Cobb-Douglas markets in a single step, smaller values adjust more cautiously
+
+    def __init__(self, damping=0.5, tolerance=1e-8, max_iter=100):
+        self.damping = damping
+        self.tolerance = tolerance  # Largest |log(Qd / Qs)| accepted as clearing
+        self.max_iter = max_iter
+        self.iterations = 0  # Number of iterations used by the last call to clear()
+
+    def get_direction(self, get_excess, x, excess):
+        # Returns the change in the log prices x that reduces the excess demand
+        return excess
+
+    def clear(self, demand_function, prices, supply):
+        # Returns the market-clearing prices and the quantity demanded of every good at those prices
+        # demand_function maps an array of prices to the array of quantities demanded
+        prices = np.array(prices, dtype=np.float64)
+        supply = np.asarray(supply, dtype=np.float64)
+        demand = demand_function(prices)
+        active = (supply > 0) & (demand > 0)
+        self.iterations = 0
+        if not np.any(active):
+            return prices, demand
+        log_supply = np.log(supply[active])
+
+        def get_excess(x):
+            # Log excess demand of the active markets, and the demand of every market, at log prices x
+            # Trial steps can overflow the prices or the demand; the non-finite excess demand they give is rejected
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                prices[active] = np.exp(x)
+                demand = demand_function(prices)
+                return np.log(demand[active]) - log_supply, demand
+
+        x = np.log(prices[active])
+        excess, demand = get_excess(x)
+        while np.max(np.abs(excess)) >= self.tolerance:
+            if self.iterations == self.max_iter:
+                logger.debug("Prices did not converge in %d iterations, largest log excess demand: %s",
+                             self.max_iter, np.max(np.abs(excess)))
+                break
+            step = self.damping * self.get_direction(get_excess, x, excess)
+            # Steps that do not reduce the excess demand are halved, so a poor direction cannot diverge
+            for halving in range(20):
+                new_excess, new_demand = get_excess(x + step)
+                if np.all(np.isfinite(new_excess)) and np.max(np.abs(new_excess)) < np.max(np.abs(excess)):
+                    break
+                step = step / 2
+            else:
+                get_excess(x)
+                logger.debug("Prices cannot be improved, largest log excess demand: %s", np.max(np.abs(excess)))
+                break
+            x = x + step
+            excess, demand = new_excess, new_demand
+            self.iterations += 1
+        return prices, demand
+
+
+class Newton(Tatonnement):
+    # Newton steps on the log excess demand, with the Jacobian (including cross-price effects) built by finite
+    # differences. Needs fewer iterations than tatonnement when the demand for goods is interdependent.
+
+    def __init__(self, damping=1, tolerance=1e-8, max_iter=50):
+        super().__init__(damping, tolerance, max_iter)
+
+    def get_direction(self, get_excess, x, excess):
+        eps = 1e-7
+        jacobian = np.empty((len(x), len(x)))
+        for j in range(len(x)):
+            step = np.zeros(len(x))
+            step[j] = eps
+            jacobian[:, j] = (get_excess(x + step)[0] - excess) / eps
+        if not np.all(np.isfinite(jacobian)) or np.linalg.cond(jacobian) > 1e12:
+            # Falls back to a tatonnement step where the Jacobian is (nearly) singular, e.g. when every worker
+            # spends their whole budget on the same bundle
+            return excess
+        return -np.linalg.solve(jacobian, excess)
+
+
+def create_price_mechanism(name, damping=None, tolerance=1e-8):
+    # Returns the price mechanism called name in MECHANISMS, or None for fixed prices
+    if name == 'fixed':
+        return None
+    mechanism = {'tatonnement': Tatonnement, 'newton': Newton}[name]()
+    if damping is not None:
+        mechanism.damping = damping
+    mechanism.tolerance = tolerance
+    return mechanism
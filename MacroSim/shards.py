@@ -0,0 +1,315 @@
+import distribution
+from demographics import Demographics
+
+import mmap
+import multiprocessing
+import numpy as np
+
+
+# Sharded simulation of a single large economy
+# The population arrays (and the flags of the workers holding the initial share issue) are moved to shared memory,
+# and the workers are split into contiguous shards of rows, each owned by a process. The shards compute the demand,
+# incomes and demographic events of their own workers, and the economy gathers their partial results in one cheap
+# step per phase: sums of demand, consumption and investment, the workers fired or due to retire or die, and
+# histograms of incomes. The shards pay out the dividends of the initial issue; once shares change hands, which only
+# happens in the main process, the economy pays out every dividend itself. Firms, markets and the labour market
+# stay in the main process, which matches workers exactly like an unsharded economy does and writes the hires
+# straight to the shared arrays.
+#
+# Processes are forked, so the shards see the shared arrays of the economy as it is when they are started.
+# The same shards can also be updated one after another in a single process (ChunkedShards), which bounds the
+# memory each phase works on when the population is kept in files (see store.py).
+
+# Population arrays that are not moved to shared memory
+PRIVATE_FIELDS = ['template']
+
+
+def create_shared(shape, dtype):
+    # Returns an array of zeros in anonymous shared memory, which is shared with the processes forked afterwards
+    dtype = np.dtype(dtype)
+    size = int(np.prod(shape))
+    return np.frombuffer(mmap.mmap(-1, max(size * dtype.itemsize, 1)), dtype=dtype, count=size).reshape(shape)
+
+
+def to_shared(array):
+    # Returns a copy of the array in anonymous shared memory
+    array = np.asarray(array)
+    shared = create_shared(array.shape, array.dtype)
+    shared[...] = array
+    return shared
+
+
+def get_bounds(pop, number_of_shards):
+    # Returns the first row of every shard and the end of the last one, splitting pop rows as evenly as possible
+    return np.linspace(0, pop, number_of_shards + 1).astype(np.int64)
+
+
+class Shard:
+    # State of the process updating the workers in rows [start, stop) of the population
+    def __init__(self, population, shares, start, stop):
+        self.population = population
+        self.shares = shares
+        self.start = start
+        self.stop = stop
+        self.demographics = None  # Calendar of the shard's own workers
+        self.incomes = None  # Incomes of the shard's part of the last income distribution
+
+
+def run_shard(connection, shard):
+    # Runs in a shard process: calls function(shard, *args) on request and sends back the result
+    # Errors are sent back to be raised in the main process
+    while True:
+        request = connection.recv()
+        if request is None:
+            connection.close()
+            break
+        function, args = request
+        try:
+            connection.send(function(shard, *args))
+        except Exception as error:
+            connection.send(error)
+
+
+class Shards:
+    # Base class of the shards an economy's workers are split in: call() runs a function on every shard, and the
+    # methods below gather the results of the phases the shards compute
+    cache_incomes = True  # Whether the shards keep their part of the income distribution in memory
+
+    def call(self, function, *args):
+        # Calls function(shard, *args) on every shard and returns the results in the order of the shards
+        raise NotImplementedError
+
+    def release_rows(self, index):
+        # Hands back the memory of the rows at index after the economy wrote to them outside of the shards
+        pass
+
+    def close(self):
+        pass
+
+    def get_demand(self, utility_function, prices):
+        # Returns the aggregate quantity demanded of each good at the given (tax-inclusive) prices
+        return sum(self.call(get_demand, utility_function, prices))
+
+    def update_incomes(self, firm_labour, firm_labour_income, firm_payouts, min_wage, income_tax):
+        # Updates the income of every worker; firm_payouts is None when the capital income of the workers was
+        # already written to the population
+        # Returns the workers fired for being paid below the minimum wage, and the total consumption and investment
+        results = self.call(update_incomes, firm_labour, firm_labour_income, firm_payouts, min_wage, income_tax)
+        fired = np.concatenate([fired for fired, consumption, investment in results])
+        return (fired, sum(consumption for fired, consumption, investment in results),
+                sum(investment for fired, consumption, investment in results))
+
+    def get_labour_force(self):
+        # Returns the number of workers who are not retired
+        return sum(self.call(count_labour_force))
+
+    def get_income_dist(self):
+        # Distribution of labour income over the labour force, split by shard
+        # Only the latest distribution can be queried, as the shards replace their part with every new one
+        self.version += 1
+        self.call(select_incomes, self.cache_incomes)
+        version = self.version
+
+        def gather(function, *args):
+            if version != self.version:
+                raise RuntimeError("the income distribution was replaced by a newer one")
+            return self.call(query_incomes, function, *args)
+
+        return distribution.GatheredIncomeDistribution(gather)
+
+
+class ShardPool(Shards):
+    # Processes each owning a shard of the workers of one economy
+    def __init__(self, econ, number_of_shards):
+        population = econ.population
+        for name, value in vars(population).items():
+            if isinstance(value, np.ndarray) and name not in PRIVATE_FIELDS:
+                setattr(population, name, to_shared(value))
+        # Arrays that were views of a template are now the economy's own
+        population.template = None
+        shares = econ.shares
+        shares.issued = to_shared(shares.issued)
+        self.bounds = get_bounds(len(population), number_of_shards)
+        self.version = 0  # Number of income distributions taken, see get_income_dist()
+        self.connections = []
+        self.processes = []
+        context = multiprocessing.get_context('fork')
+        for start, stop in zip(self.bounds[:-1], self.bounds[1:]):
+            connection, child_connection = context.Pipe()
+            process = context.Process(target=run_shard, daemon=True,
+                                      args=(child_connection, Shard(population, econ.shares, start, stop)))
+            process.start()
+            child_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def __len__(self):
+        return len(self.connections)
+
+    def call(self, function, *args):
+        # The shards run the function at once
+        for connection in self.connections:
+            connection.send((function, args))
+        results = [connection.recv() for connection in self.connections]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+
+class ChunkedShards(Shards):
+    # Shards of chunk_size rows updated one after another in this process
+    # With a store (see store.py), the pages of each chunk are released once the chunk is done, and the parts of the
+    # income distribution are read from the population whenever they are queried instead of being kept in memory
+    def __init__(self, population, shares, chunk_size, store=None):
+        pop = len(population)
+        self.shards = [Shard(population, shares, start, min(start + chunk_size, pop))
+                       for start in range(0, pop, chunk_size)]
+        self.store = store
+        self.cache_incomes = store is None
+        self.version = 0
+
+    def __len__(self):
+        return len(self.shards)
+
+    def call(self, function, *args):
+        results = []
+        for shard in self.shards:
+            results.append(function(shard, *args))
+            if self.store is not None:
+                self.store.release(shard.start, shard.stop)
+        return results
+
+    def release_rows(self, index):
+        if self.store is not None:
+            self.store.release_rows(index)
+
+    def close(self):
+        if self.store is not None:
+            self.store.flush()
+
+
+# Functions run in the shard processes
+
+
+def get_demand(shard, utility_function, prices):
+    population = shard.population
+    rows = slice(shard.start, shard.stop)
+    return utility_function.get_demand(population.consumption[rows], population.weights[rows], prices)
+
+
+def update_incomes(shard, firm_labour, firm_labour_income, firm_payouts, min_wage, income_tax):
+    population = shard.population
+    rows = slice(shard.start, shard.stop)
+    if firm_payouts is None:
+        capital_income = population.capital_income[rows].copy()
+    else:
+        capital_income = shard.shares.get_payouts(firm_payouts, rows)
+    return population.update_income(firm_labour, firm_labour_income, capital_income, min_wage, income_tax,
+                                    np.arange(shard.start, shard.stop))
+
+
+def start_demographics(shard, month, retirement_age, age_to_die):
+    population = shard.population
+    rows = slice(shard.start, shard.stop)
+    shard.demographics = Demographics(population.birth_month[rows], population.retired[rows], retirement_age,
+                                      age_to_die)
+    shard.demographics.month = month
+
+
+def set_ages(shard, retirement_age, age_to_die):
+    population = shard.population
+    rows = slice(shard.start, shard.stop)
+    shard.demographics.set_ages(retirement_age, age_to_die, population.birth_month[rows], population.retired[rows])
+
+
+def pop_due(shard, month, event, scheduled):
+    # Files the events of the shard's workers among those born since the last call, then returns the workers whose
+    # event is due by the month
+    population = shard.population
+    rows = slice(shard.start, shard.stop)
+    scheduled = scheduled[(scheduled >= shard.start) & (scheduled < shard.stop)]
+    shard.demographics.schedule(scheduled - shard.start, population.birth_month[rows], population.retired[rows])
+    shard.demographics.month = month
+    return shard.demographics.pop_due(event) + shard.start
+
+
+def count_labour_force(shard):
+    return (shard.stop - shard.start) - int(np.count_nonzero(shard.population.retired[shard.start:shard.stop]))
+
+
+def get_incomes(shard):
+    # Returns the labour incomes of the shard's workers in the labour force
+    population = shard.population
+    rows = slice(shard.start, shard.stop)
+    return population.labour_income[rows][~population.retired[rows]]
+
+
+def select_incomes(shard, cache):
+    shard.incomes = get_incomes(shard) if cache else None
+
+
+def query_incomes(shard, function, *args):
+    return function(shard.incomes if shard.incomes is not None else get_incomes(shard), *args)
+
+
+class ShardedDemographics:
+    # Takes the place of an economy's Demographics while it is sharded: each shard keeps the calendar of its own
+    # workers. The clock is kept here, and the workers born since the last query are sent along with the next one.
+    def __init__(self, pool, demographics):
+        self.pool = pool
+        self.month = demographics.month
+        self.retirement_age = demographics.retirement_age
+        self.age_to_die = demographics.age_to_die
+        self.scheduled = []  # Indices of the workers born since the shards were last queried
+        pool.call(start_demographics, self.month, self.retirement_age, self.age_to_die)
+
+    def get_ages(self, birth_month):
+        return (self.month - birth_month) / 12
+
+    def schedule(self, index, birth_month, retired):
+        self.scheduled.append(np.asarray(index, dtype=np.int64))
+
+    def set_ages(self, retirement_age, age_to_die, birth_month, retired):
+        if retirement_age == self.retirement_age and age_to_die == self.age_to_die:
+            return
+        self.retirement_age = retirement_age
+        self.age_to_die = age_to_die
+        # The shards rebuild their calendars from the population, which includes the workers born since
+        self.scheduled = []
+        self.pool.call(set_ages, retirement_age, age_to_die)
+
+    def advance(self, months):
+        self.month += months
+
+    def pop_due(self, event):
+        scheduled = np.concatenate(self.scheduled) if self.scheduled else np.empty(0, dtype=np.int64)
+        self.scheduled = []
+        # The shards hold consecutive rows, so their results joined in order are sorted
+        return np.concatenate(self.pool.call(pop_due, self.month, event, scheduled))
+
+
+def shard_economy(econ, number_of_shards):
+    # Splits the workers of an economy over number_of_shards processes
+    econ.shards = ShardPool(econ, number_of_shards)
+    econ.demographics = ShardedDemographics(econ.shards, econ.demographics)
+
+
+def unshard_economy(econ):
+    # Stops the shards of an economy, which carries on updating all of its workers at once
+    if isinstance(econ.demographics, ShardedDemographics):
+        population = econ.population
+        demographics = Demographics(population.birth_month, population.retired, econ.demographics.retirement_age,
+                                    econ.demographics.age_to_die)
+        demographics.month = econ.demographics.month
+        econ.demographics = demographics
+    econ.shards.close()
+    econ.shards = None
@@ -0,0 +1,114 @@
+import numpy as np
+import scipy.sparse
+
+
+class ShareRegistry:
+    # Ownership of every firm's shares by the workers, as a (workers x firms) matrix of the number of shares held
+    # The equal initial issue is not stored per worker: every worker still flagged in issued holds issue[firm] shares
+    # of each firm, and holdings only records the deviations from it made by transfers. The deviations are a dense
+    # array by default, allocated on the first transfer. With sparse=True they are a CSR matrix, which suits
+    # economies where few workers trade shares; transfers are then buffered and merged into the matrix in one go.
+    # Dividend payouts to every worker are a single matrix-vector product over the deviations.
+    def __init__(self, pop, shares_per_firm, sparse=False):
+        self.shares_per_firm = np.asarray(shares_per_firm, dtype=np.float64)  # Number of shares issued by each firm
+        self.sparse = sparse
+        self.shape = (pop, len(self.shares_per_firm))
+        self.issue = np.zeros(len(self.shares_per_firm))  # Shares of each firm held by every worker from the issue
+        self.issued = np.zeros(pop, dtype=bool)  # Whether each worker still holds the initial issue
+        # Deviations from the initial issue, None while there are none in the dense representation
+        self.holdings = scipy.sparse.csr_matrix(self.shape, dtype=np.float64) if sparse else None
+        # Transfers not yet merged into a sparse matrix, as (worker, firm, change in shares)
+        self.pending = ([], [], [])
+
+    def issue_equally(self):
+        # Distributes the shares of every firm equally among all workers
+        self.issue = self.shares_per_firm / self.shape[0]
+        self.issued[:] = True
+
+    def commit(self):
+        # Merges the pending transfers into a sparse matrix
+        if self.sparse and self.pending[0]:
+            rows, firms, changes = (np.concatenate(part) for part in self.pending)
+            self.holdings = (self.holdings + scipy.sparse.csr_matrix((changes, (rows, firms)),
+                                                                      shape=self.shape)).tocsr()
+            self.holdings.eliminate_zeros()
+            self.pending = ([], [], [])
+
+    def has_deviations(self):
+        # Whether any shares have changed hands since the initial issue
+        if self.sparse:
+            return bool(self.pending[0]) or self.holdings.nnz > 0
+        return self.holdings is not None
+
+    def get_deviations(self):
+        # Returns the dense deviations from the initial issue, allocating them if there are none yet
+        if self.holdings is None:
+            self.holdings = np.zeros(self.shape)
+        return self.holdings
+
+    def get_holdings(self, index):
+        # Returns the shares held by one worker in every firm
+        self.commit()
+        holdings = self.issue * self.issued[index]
+        if self.sparse:
+            return holdings + self.holdings[index].toarray().ravel()
+        if self.holdings is not None:
+            return holdings + self.holdings[index]
+        return holdings
+
+    def get_owned(self, workers, firms):
+        # Returns the shares held by each (worker, firm) pair
+        self.commit()
+        owned = self.issue[firms] * self.issued[workers]
+        if self.sparse:
+            return owned + np.asarray(self.holdings[workers, firms]).ravel()
+        if self.holdings is not None:
+            return owned + self.holdings[workers, firms]
+        return owned
+
+    def transfer(self, seller, buyer, firm, shares):
+        # Moves shares of firms from sellers to buyers; every argument can be a scalar or an array
+        seller, buyer, firm, shares = np.broadcast_arrays(*(np.atleast_1d(value) for value in
+                                                            (seller, buyer, firm, np.asarray(shares, np.float64))))
+        if np.any(shares < 0):
+            raise ValueError("the number of shares transferred must be positive")
+        # A seller may appear more than once, so the check is on the total sold of each (seller, firm) pair
+        pairs, inverse = np.unique(np.stack([seller, firm], axis=1), axis=0, return_inverse=True)
+        sold = np.bincount(inverse.ravel(), weights=shares, minlength=len(pairs))
+        if np.any(self.get_owned(pairs[:, 0], pairs[:, 1]) < sold):
+            raise ValueError("a seller does not own enough shares")
+        if self.sparse:
+            self.pending[0].extend([seller, buyer])
+            self.pending[1].extend([firm, firm])
+            self.pending[2].extend([-shares, shares])
+        else:
+            holdings = self.get_deviations()
+            np.subtract.at(holdings, (seller, firm), shares)
+            np.add.at(holdings, (buyer, firm), shares)
+
+    def clear(self, index):
+        # Removes every share held by a worker, or by each worker in an array of indices
+        self.issued[index] = False
+        if self.sparse:
+            self.commit()
+            holdings = self.holdings
+            if np.ndim(index) == 0:
+                holdings.data[holdings.indptr[index]:holdings.indptr[index + 1]] = 0
+            elif holdings.nnz > 0:
+                rows = np.repeat(np.arange(self.shape[0]), np.diff(holdings.indptr))
+                holdings.data[np.isin(rows, index)] = 0
+        elif self.holdings is not None:
+            self.holdings[index] = 0
+
+    def get_payouts(self, firm_income, index=None):
+        # Returns the capital income received by each worker (or the selected workers) when every firm pays out
+        # firm_income to its shareholders in proportion to the shares they hold
+        self.commit()
+        dividend = np.asarray(firm_income, dtype=np.float64) / self.shares_per_firm  # Dividend per share
+        issued = self.issued if index is None else self.issued[index]
+        # Every worker holding the initial issue receives the same payout from it
+        payouts = issued * float(self.issue @ dividend)
+        if self.has_deviations():
+            holdings = self.holdings if index is None else self.holdings[index]
+            payouts = payouts + np.asarray(holdings @ dividend).ravel()
+        return payouts
@@ -0,0 +1,154 @@
+import shards
+from population import Population
+
+import copy
+import json
+import mmap
+import os
+import numpy as np
+
+
+# Memory-mapped agent store
+# Keeps the population arrays of an economy (and the deviations from the initial share issue, when they are dense and
+# shares have changed hands before the economy was stored) in .npy files mapped in memory, so that a population can
+# be larger than memory. The files are created empty, and a new population is generated straight into them a chunk
+# of rows at a time (create_population). The demand and income phases go through the workers in chunks of rows
+# (shards.ChunkedShards), and the pages of each chunk are handed back to the operating system once the chunk is done.
+# The rows the economy writes to between the phases (workers retiring, dying, hired or fired) are handed back once
+# each batch is done (AgentStore.release_rows), so the stored arrays themselves only keep the working chunk resident;
+# the rest is left to the page cache and the disk.
+#
+# The files are plain .npy files, which analysis tools can open read-only while the simulation runs (open_store)
+# without copying them. store.json is rewritten at the end of every period with the number of the last period
+# completed. The arrays are not snapshots: they change in place while the next period runs, so a reader going
+# through them during a period can see rows of two different periods. Readers needing a consistent view should
+# copy the arrays between two periods, and check that the period in store.json has not changed in the meantime.
+#
+# The unemployed pool and the demographic calendar stay in memory, which is about 80 bytes per worker. The Gini
+# coefficient of a stored economy is estimated from the chunks (distribution.GatheredIncomeDistribution), so it can
+# differ slightly from the exact value of an economy kept in memory.
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+class AgentStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.maps = {}  # Name of each array -> memory map of its file, offset of the data, bytes per row
+        os.makedirs(directory, exist_ok=True)
+
+    def create(self, name, shape, dtype=np.float64):
+        # Creates <name>.npy holding an array of zeros and returns a view of the file mapped in memory
+        # The file is sparse: the zeros are not written, and take no memory or disk space until they are changed
+        path = os.path.join(self.directory, name + '.npy')
+        offset = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape).offset
+        # The file is mapped again here, as releasing its pages needs the memory map itself
+        with open(path, 'r+b') as f:
+            mapped = mmap.mmap(f.fileno(), 0)
+        view = np.ndarray(shape, dtype, buffer=mapped, offset=offset)
+        self.maps[name] = (mapped, offset, view.nbytes // max(len(view), 1))
+        return view
+
+    def copy(self, name, array, chunk_size=DEFAULT_CHUNK_SIZE):
+        # Writes the array to <name>.npy a chunk of rows at a time and returns a view of the file mapped in memory
+        view = self.create(name, array.shape, array.dtype)
+        for start in range(0, len(array), chunk_size):
+            view[start:start + chunk_size] = array[start:start + chunk_size]
+            self.release(start, start + chunk_size, name)
+        return view
+
+    def release(self, start, stop, *names):
+        # Drops rows [start, stop) of the named arrays (every array by default) from memory; their changes are kept
+        # in the files
+        for mapped, offset, row_bytes in (self.maps[name] for name in names or self.maps):
+            begin = (offset + start * row_bytes) // mmap.PAGESIZE * mmap.PAGESIZE
+            end = offset + stop * row_bytes
+            if end > begin:
+                mapped.madvise(mmap.MADV_DONTNEED, begin, end - begin)
+
+    def release_rows(self, index):
+        # Drops the rows at the given indices of every array from memory; their changes are kept in the files
+        # The pages holding the rows are merged into runs of consecutive pages, each released at once
+        index = np.unique(index)
+        if len(index) == 0:
+            return
+        for mapped, offset, row_bytes in self.maps.values():
+            first = (offset + index * row_bytes) // mmap.PAGESIZE
+            last = (offset + (index + 1) * row_bytes - 1) // mmap.PAGESIZE
+            starts = np.flatnonzero(np.concatenate([[True], first[1:] > last[:-1] + 1]))
+            ends = np.append(starts[1:], len(index)) - 1
+            for begin, end in zip(first[starts].tolist(), last[ends].tolist()):
+                mapped.madvise(mmap.MADV_DONTNEED, begin * mmap.PAGESIZE, (end - begin + 1) * mmap.PAGESIZE)
+
+    def flush(self):
+        # Writes every change to disk
+        for mapped, offset, row_bytes in self.maps.values():
+            mapped.flush()
+
+    def sync(self, period):
+        # Records the last period completed, for the tools reading the store
+        path = os.path.join(self.directory, 'store.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'period': period, 'arrays': sorted(self.maps)}, f)
+        os.replace(path + '.tmp', path)
+
+
+def get_directory(directory, economy_id):
+    # Returns the directory of the store of an economy
+    return os.path.join(directory, 'economy{}'.format(economy_id))
+
+
+def create_population(agent_store, pop, parameters):
+    # Creates a population of pop workers in the store from their initial parameters, given as consecutive chunks
+    # of rows of (utility function parameters, productivities, ages)
+    # Each chunk is initialized as a population of its own and written to the files, so only one chunk of the
+    # population is ever held in memory
+    population = None
+    start = 0
+    for util_func_params, productivity_parameters, ages in parameters:
+        rows = Population(productivity_parameters, ages, util_func_params)
+        arrays = {name: value for name, value in vars(rows).items() if isinstance(value, np.ndarray)}
+        if population is None:
+            # The population takes the attributes of its first chunk, with every array created in the store
+            population = copy.copy(rows)
+            for name, value in arrays.items():
+                setattr(population, name, agent_store.create(name, (pop,) + value.shape[1:], value.dtype))
+        for name, value in arrays.items():
+            getattr(population, name)[start:start + len(value)] = value
+        agent_store.release(start, start + len(rows), *arrays)
+        start += len(rows)
+    return population
+
+
+def store_economy(econ, directory, chunk_size=DEFAULT_CHUNK_SIZE, agent_store=None):
+    # Moves the workers of an economy to a store in <directory>/economy<id>, updated in chunks of chunk_size rows
+    # Arrays already in the store (see create_population) are left in place
+    if agent_store is None:
+        agent_store = AgentStore(get_directory(directory, econ.id))
+    population = econ.population
+    for name, value in list(vars(population).items()):
+        if isinstance(value, np.ndarray) and name not in agent_store.maps:
+            setattr(population, name, agent_store.copy(name, value, chunk_size))
+    # Arrays that were views of a template are now the economy's own
+    population.template = None
+    econ.shares.issued = agent_store.copy('issued', econ.shares.issued, chunk_size)
+    if not econ.shares.sparse and econ.shares.holdings is not None:
+        # Dense deviations from the initial issue are only stored once shares have changed hands; until then, like
+        # in memory, there are none and the payouts only depend on the issue
+        econ.shares.holdings = agent_store.copy('holdings', econ.shares.holdings, chunk_size)
+    # The rows the economy touched while it was set up (e.g. the initial hires) are handed back too
+    agent_store.release(0, len(population))
+    econ.shards = shards.ChunkedShards(population, econ.shares, chunk_size, agent_store)
+
+
+def sync_economy(econ, period):
+    econ.shards.store.sync(period)
+
+
+def open_store(directory):
+    # Opens the store of an economy read-only, without copying it
+    # Returns the last period completed and the arrays by name
+    with open(os.path.join(directory, 'store.json')) as f:
+        state = json.load(f)
+    return state['period'], {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+                             for name in state['arrays']}
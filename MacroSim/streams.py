@@ -0,0 +1,37 @@
+import numpy as np
+
+
+# Random number streams
+# A run is seeded by a single numpy SeedSequence. The initial population and every economy get their own child
+# sequence, and each economy spawns one independent Generator per subsystem from its sequence. The streams of an
+# economy therefore only depend on the seed and the economy's position, not on the order in which the economies are
+# updated or on the process they are updated in, so serial and parallel runs of the same seed are identical.
+
+# Subsystems of an economy that draw random numbers
+SUBSYSTEMS = ['labour_market', 'demographics']
+
+
+def spawn_seeds(seed, number_of_economies):
+    # Returns the seed sequence of the initial population and one for each economy
+    children = np.random.SeedSequence(seed).spawn(number_of_economies + 1)
+    return children[0], children[1:]
+
+
+def create_streams(seed_sequence):
+    # Returns a Generator for every subsystem, by name
+    return {name: np.random.Generator(np.random.PCG64(child))
+            for name, child in zip(SUBSYSTEMS, seed_sequence.spawn(len(SUBSYSTEMS)))}
+
+
+def get_state(streams):
+    return {name: generator.bit_generator.state for name, generator in streams.items()}
+
+
+def restore_streams(state):
+    # Returns streams restored from the state returned by get_state
+    streams = {}
+    for name, generator_state in state.items():
+        generator = np.random.Generator(np.random.PCG64())
+        generator.bit_generator.state = generator_state
+        streams[name] = generator
+    return streams
@@ -0,0 +1,38 @@
+from population import Population, TEMPLATE_FIELDS
+
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
+
+
+class PopulationTemplate:
+    # Read-only initial parameters of a population, shared by every economy that starts from it
+    # The parameters (TEMPLATE_FIELDS) are written once to .npy files, in shared memory (/dev/shm) where available.
+    # Each economy's population memory-maps them copy-on-write: pages are shared between the economies, and
+    # between the processes of a parallel engine, until an economy writes to them (e.g. when a worker dies and
+    # a new one takes the slot), so only the state that diverges is held by each economy.
+    # The initial share holdings are not part of the template: the equal issue is implicit in the share registry,
+    # which only stores the holdings that diverge from it.
+    # The files are removed when the template is no longer used.
+    def __init__(self, productivity_parameters, ages, util_func_params, directory=None):
+        population = Population(productivity_parameters, ages, util_func_params)
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='macrosim_template_',
+                                         dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+            self.finalizer = weakref.finalize(self, shutil.rmtree, directory, True)
+        self.directory = directory
+        for name in TEMPLATE_FIELDS:
+            np.save(os.path.join(directory, name + '.npy'), getattr(population, name))
+
+    def __getstate__(self):
+        # Copies sent to other processes only refer to the files, which stay owned by the original template
+        return {'directory': self.directory}
+
+    def open(self, name):
+        # Returns a private copy-on-write view of one of the parameters
+        return np.load(os.path.join(self.directory, name + '.npy'), mmap_mode='c')
+
+    def create_population(self):
+        return Population(template=self)
@@ -0,0 +1,55 @@
+import types
+
+import numpy as np
+import pytest
+
+import costmin
+import economy
+from firm_table import FirmTable
+
+
+# Regression test of the batched cost minimization against the single-firm SLSQP solution it replaced
+
+def create_firms(rng, number_of_markets=3, firms_per_market=4):
+    # Returns random firms with labour, as views over a firm table of a minimal economy
+    econ = types.SimpleNamespace(firm_table=FirmTable(number_of_markets, firms_per_market))
+    econ.markets = [economy.Market(econ, i) for i in range(number_of_markets)]
+    econ.firms = [economy.Firm(econ, i) for i in range(number_of_markets * firms_per_market)]
+    table = econ.firm_table
+    table.quantity_sold[:] = rng.uniform(5, 500, number_of_markets)
+    table.labour[:] = rng.uniform(1, 100, len(table))
+    table.capital[:] = rng.uniform(0.5, 10, len(table))
+    table.tfp[:] = rng.uniform(1, 20, len(table))
+    table.a[:, 0] = rng.uniform(0.2, 0.8, len(table))
+    table.a[:, 1] = rng.uniform(0.1, 0.6, len(table))
+    table.wage[:] = table.get_wage()
+    return econ
+
+
+def get_slsqp_targets(econ, int_rate):
+    return np.array([firm.cost_min_solution(int_rate).x for firm in econ.firms])
+
+
+@pytest.mark.parametrize('int_rate', [0.01, 0.1, 1.0])
+def test_closed_form_matches_slsqp(int_rate):
+    econ = create_firms(np.random.default_rng(0))
+    table = econ.firm_table
+    L, K = costmin.COBB_DOUGLAS.cost_min(table.tfp, table.a, table.get_wage(), np.float64(int_rate),
+                                         table.quantity_sold[table.market])
+    np.testing.assert_allclose(np.column_stack([L, K]), get_slsqp_targets(econ, int_rate), rtol=1e-4)
+
+
+@pytest.mark.parametrize('int_rate', [0.01, 0.1, 1.0])
+def test_newton_matches_slsqp(int_rate):
+    econ = create_firms(np.random.default_rng(1))
+    table = econ.firm_table
+    L, K = costmin.newton_cost_min(costmin.COBB_DOUGLAS, table.tfp, table.a, table.get_wage(), np.float64(int_rate),
+                                   table.quantity_sold[table.market])
+    np.testing.assert_allclose(np.column_stack([L, K]), get_slsqp_targets(econ, int_rate), rtol=1e-4)
+
+
+def test_update_cost_min_targets():
+    econ = create_firms(np.random.default_rng(2))
+    costmin.update_cost_min_targets(econ.firm_table, 0.1)
+    targets = np.column_stack([econ.firm_table.target_L, econ.firm_table.target_K])
+    np.testing.assert_allclose(targets, get_slsqp_targets(econ, 0.1), rtol=1e-4)
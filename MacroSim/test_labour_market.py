@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from labour_market import UnemployedPool
+
+
+# The unemployed pool against a set of the same members
+
+def check_pool(pool, members, pop):
+    assert set(pool) == members and len(pool) == len(members)
+    assert all(pool.position[pool.members[i]] == i for i in range(len(pool)))
+    assert all(pool.position[worker] == -1 for worker in range(pop) if worker not in members)
+
+
+def test_remove_many_matches_set():
+    rng = np.random.default_rng(0)
+    for trial in range(100):
+        pop = int(rng.integers(1, 50))
+        pool = UnemployedPool(pop, rng.permutation(pop)[:rng.integers(0, pop + 1)])
+        members = set(pool)
+        for step in range(4):
+            current = np.array(sorted(members), dtype=np.int64)
+            removed = rng.choice(current, rng.integers(0, len(current) + 1), replace=False)
+            # Repeated indices are removed once
+            pool.remove_many(np.concatenate([removed, removed[:2]]))
+            members -= set(removed.tolist())
+            check_pool(pool, members, pop)
+            added = rng.integers(0, pop, 3)
+            pool.add_many(added)
+            members |= set(added.tolist())
+            check_pool(pool, members, pop)
+
+
+def test_remove_many_rejects_employed():
+    pool = UnemployedPool(5, [1, 2])
+    with pytest.raises(ValueError):
+        pool.remove_many([3])
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import engine
+from shareholding import ShareRegistry
+
+
+# The share registry against a dense (workers x firms) model of the same holdings
+
+def create_registry(sparse):
+    # Returns a registry and the dense holdings it should represent, after a few transfers and clears
+    registry = ShareRegistry(6, [10., 20., 30.], sparse)
+    registry.issue_equally()
+    holdings = np.tile(np.array([10., 20., 30.]) / 6, (6, 1))
+    registry.transfer([0, 0, 1], [2, 3, 3], [1, 1, 2], [1., 2., 3.])
+    np.subtract.at(holdings, ([0, 0, 1], [1, 1, 2]), [1., 2., 3.])
+    np.add.at(holdings, ([2, 3, 3], [1, 1, 2]), [1., 2., 3.])
+    for worker in (4, 3):
+        registry.clear(worker)
+        holdings[worker] = 0
+    return registry, holdings
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_registry_matches_dense_holdings(sparse):
+    registry, holdings = create_registry(sparse)
+    income = np.array([5., 7., 11.])
+    payouts = holdings @ (income / registry.shares_per_firm)
+    np.testing.assert_allclose(registry.get_payouts(income), payouts)
+    np.testing.assert_allclose(registry.get_payouts(income, np.array([1, 3])), payouts[[1, 3]])
+    np.testing.assert_allclose(registry.get_holdings(2), holdings[2])
+    np.testing.assert_allclose(registry.get_owned(np.array([0, 1]), np.array([1, 2])), holdings[[0, 1], [1, 2]])
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_clear_many(sparse):
+    registry, holdings = create_registry(sparse)
+    registry.clear(np.array([0, 2]))
+    holdings[[0, 2]] = 0
+    income = np.array([5., 7., 11.])
+    np.testing.assert_allclose(registry.get_payouts(income), holdings @ (income / registry.shares_per_firm))
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_overdrawn_transfer(sparse):
+    registry, holdings = create_registry(sparse)
+    with pytest.raises(ValueError):
+        registry.transfer(4, 0, 0, 1.)
+
+
+def test_template_economies_hold_no_holdings():
+    # The equal issue is implicit, so no economy allocates per-worker holdings before shares change hands
+    for econ in engine.create_economies(50, 2, 3, 2, seed=0):
+        assert econ.shares.holdings is None
+        np.testing.assert_allclose(econ.shares.get_holdings(0).sum() * 50, econ.shares.shares_per_firm.sum())
@@ -0,0 +1,76 @@
+import numpy as np
+
+
+# Demand engine: solves the utility-maximization problem of every worker for all goods at once
+# Each worker's utility weights are kept normalised to sum to one (Population.weights, workers x goods), so the
+# aggregate demand of a utility function that is homothetic in its weights is a single product of the consumption
+# vector with the weight matrix, divided by the tax-inclusive prices
+
+
+class UtilityFunction:
+    # Base class for a utility function over consumption goods evaluated over arrays of workers
+    # Subclasses implement get_spending(), the amount each worker spends on each good; get_demand() then sums the
+    # spending over workers
+
+    def get_spending(self, consumption, weights, prices):
+        # Returns a (workers x goods) array of spending, given each worker's consumption budget
+        raise NotImplementedError
+
+    def get_demand(self, consumption, weights, prices):
+        # Returns an array of the aggregate quantity demanded of each good at the given (tax-inclusive) prices
+        return self.get_spending(consumption, weights, prices).sum(axis=0) / prices
+
+
+class CobbDouglas(UtilityFunction):
+    # U(x) = sum_j w_j * log(x_j): every worker spends the fraction w_j of their budget on good j
+
+    def get_spending(self, consumption, weights, prices):
+        return consumption[:, np.newaxis] * weights
+
+    def get_demand(self, consumption, weights, prices):
+        return (consumption @ weights) / prices
+
+
+class CES(UtilityFunction):
+    # U(x) = (sum_j w_j^(1/e) * x_j^((e-1)/e))^(e/(e-1)) with elasticity of substitution e
+    # The budget share of good j is w_j * p_j^(1-e) / sum_k w_k * p_k^(1-e); e = 1 is Cobb-Douglas
+
+    def __init__(self, elasticity):
+        self.elasticity = elasticity
+
+    def get_spending(self, consumption, weights, prices):
+        shares = weights * prices**(1 - self.elasticity)
+        shares /= shares.sum(axis=1)[:, np.newaxis]
+        return consumption[:, np.newaxis] * shares
+
+    def get_demand(self, consumption, weights, prices):
+        # The price factor is common to every worker, so only the normalisation is per worker
+        factor = prices**(1 - self.elasticity)
+        return (consumption / (weights @ factor)) @ weights * factor / prices
+
+
+class StoneGeary(UtilityFunction):
+    # U(x) = sum_j w_j * log(x_j - s_j), where s_j is the subsistence quantity of good j
+    # Workers first buy the subsistence quantities and spend what is left over like Cobb-Douglas. A worker who
+    # cannot afford the subsistence bundle buys the same fraction of every subsistence quantity.
+
+    def __init__(self, subsistence):
+        self.subsistence = np.asarray(subsistence, dtype=np.float64)
+
+    def split_budget(self, consumption, prices):
+        # Returns the fraction of the subsistence bundle bought and the budget left over by each worker
+        cost = self.subsistence @ prices
+        if cost <= 0:
+            return np.ones(len(consumption)), consumption
+        return np.minimum(consumption / cost, 1), np.maximum(consumption - cost, 0)
+
+    def get_spending(self, consumption, weights, prices):
+        bought, left_over = self.split_budget(consumption, prices)
+        return bought[:, np.newaxis] * (self.subsistence * prices) + left_over[:, np.newaxis] * weights
+
+    def get_demand(self, consumption, weights, prices):
+        bought, left_over = self.split_budget(consumption, prices)
+        return bought.sum() * self.subsistence + (left_over @ weights) / prices
+
+
+COBB_DOUGLAS = CobbDouglas()